@@ -0,0 +1,145 @@
+# COHA_Bursts.py
+# Trend and burst statistics for every lemma at once.
+#
+# The year x lemma counts of the cube are pivoted into a sparse lemma x year
+# matrix (scipy CSR; only observed cells are stored), normalized per million
+# tokens of each year, and scored in dense blocks of CHUNK_ROWS lemmas:
+#
+#   slope         OLS slope of per-million frequency, per decade; rel_slope is
+#                 the same relative to the lemma's mean frequency
+#   change_score  best single change point: the largest standardized difference
+#                 between the mean before and after a split year (CUSUM style,
+#                 signed: > 0 rising, < 0 falling), with at least MIN_SEGMENT
+#                 years on each side; change_year is the first year after the
+#                 split and shift the difference in per-million
+#   burst_z       largest z-score of a year against the WINDOW previous years,
+#                 with the baseline's spread floored at one token in that year
+#
+# Output: out_trend_stats.parquet (all lemmas) and out_rising_falling.parquet
+# (the TOP strongest rising and falling lemmas with at least MIN_COUNT tokens).
+from pathlib import Path
+import argparse
+import time
+import numpy as np
+import polars as pl
+from scipy import sparse
+
+from COHA_Trends import CUBE_PATH
+
+CHUNK_ROWS = 50_000
+WINDOW = 10
+MIN_SEGMENT = 5
+MIN_COUNT = 20
+TOP = 100
+
+def lemma_year_matrix(cube):
+    """
+    Sparse lemma x year count matrix from a cube with year, lemma and n.
+    Returns (matrix, lemmas, years, totals) where totals are the year's tokens.
+    """
+    by = cube.drop_nulls(["lemma","year"]).group_by(["lemma","year"]).agg(pl.col("n").sum())
+    years = np.sort(by["year"].unique().to_numpy())
+    lemmas = by["lemma"].unique().sort()
+    rows = lemmas.search_sorted(by["lemma"]).to_numpy()
+    cols = np.searchsorted(years, by["year"].to_numpy())
+    counts = sparse.csr_matrix(
+        (by["n"].to_numpy().astype(np.float64), (rows, cols)), shape=(len(lemmas), len(years))
+    )
+    tot = dict(cube.group_by("year").agg(pl.col("n").sum()).drop_nulls("year").iter_rows())
+    totals = np.array([tot.get(int(y), 0) for y in years], dtype=np.float64)
+    return counts, lemmas, years, totals
+
+def _block_stats(X, years, min_pm, window):
+    # X: dense per-million block (lemmas x years)
+    T = X.shape[1]
+    idx = np.arange(len(X))
+    out = {}
+    # change point: every split after k = 1..T-1 years
+    cs = np.cumsum(X, axis=1)
+    k = np.arange(1, T)
+    before = cs[:, :-1] / k
+    after = (cs[:, -1:] - cs[:, :-1]) / (T - k)
+    sigma = X.std(axis=1, keepdims=True)
+    sigma[sigma == 0] = 1.0
+    score = (after - before) * np.sqrt(k * (T - k) / T) / sigma
+    if T > 2 * MIN_SEGMENT:
+        # a split right at the edge is a one-year spike, which burst_z covers
+        edge = (k < MIN_SEGMENT) | (T - k < MIN_SEGMENT)
+        score[:, edge] = 0.0
+    best = np.abs(score).argmax(axis=1) if T > 1 else np.zeros(len(X), dtype=np.int64)
+    if T > 1:
+        out["change_score"] = score[idx, best]
+        out["change_year"] = years[best + 1]
+        out["shift"] = (after - before)[idx, best]
+    else:
+        out["change_score"] = out["shift"] = np.zeros(len(X))
+        out["change_year"] = np.full(len(X), years[0] if T else 0)
+    # bursts against the rolling baseline of the previous `window` years
+    if T > window:
+        c1 = np.concatenate([np.zeros((len(X), 1)), cs], axis=1)
+        c2 = np.concatenate([np.zeros((len(X), 1)), np.cumsum(X * X, axis=1)], axis=1)
+        mean = (c1[:, window:T] - c1[:, :T - window]) / window
+        var = (c2[:, window:T] - c2[:, :T - window]) / window - mean * mean
+        sd = np.maximum(np.sqrt(np.clip(var, 0, None)), min_pm[window:])
+        z = (X[:, window:] - mean) / sd
+        at = z.argmax(axis=1)
+        out["burst_z"] = z[idx, at]
+        out["burst_year"] = years[window + at]
+    else:
+        out["burst_z"] = np.full(len(X), np.nan)
+        out["burst_year"] = np.zeros(len(X), dtype=years.dtype)
+    return out
+
+def trend_stats(cube, window=WINDOW, chunk_rows=CHUNK_ROWS):
+    counts, lemmas, years, totals = lemma_year_matrix(cube)
+    scale = np.divide(1e6, totals, out=np.zeros_like(totals), where=totals > 0)
+    per_million = (counts @ sparse.diags(scale)).tocsr()
+    # slope of an OLS fit over all years, as one sparse matrix-vector product
+    t = years - years.mean()
+    denom = float((t * t).sum()) or 1.0
+    mean_pm = np.asarray(per_million.mean(axis=1)).ravel()
+    slope = per_million @ t / denom * 10
+
+    blocks = []
+    for a in range(0, len(lemmas), chunk_rows):
+        X = per_million[a:a + chunk_rows].toarray()
+        blocks.append(_block_stats(X, years, scale, window))
+    cols = {name: np.concatenate([b[name] for b in blocks]) for name in blocks[0]} if blocks else {}
+    return pl.DataFrame({
+        "lemma": lemmas,
+        "n": np.asarray(counts.sum(axis=1)).ravel().astype(np.int64),
+        "years": np.diff(counts.indptr),
+        "mean_per_million": mean_pm,
+        "slope": slope,
+        "rel_slope": np.divide(slope, mean_pm, out=np.zeros_like(slope), where=mean_pm > 0),
+        **cols,
+    })
+
+def rising_falling(stats, top=TOP, min_count=MIN_COUNT):
+    eligible = stats.filter(pl.col("n") >= min_count)
+    rising = eligible.filter(pl.col("change_score") > 0).sort("change_score", descending=True).head(top)
+    falling = eligible.filter(pl.col("change_score") < 0).sort("change_score").head(top)
+    return pl.concat([
+        rising.with_columns(pl.lit("rising").alias("direction"), pl.int_range(1, pl.len() + 1).alias("rank")),
+        falling.with_columns(pl.lit("falling").alias("direction"), pl.int_range(1, pl.len() + 1).alias("rank")),
+    ]).select(["direction","rank", pl.exclude(["direction","rank"])])
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Rising/falling lemmas and bursts across the whole COHA cube")
+    ap.add_argument("--cube", default=str(CUBE_PATH), help="year x lemma (x pos) Parquet cube")
+    ap.add_argument("--window", type=int, default=WINDOW)
+    ap.add_argument("--top", type=int, default=TOP)
+    ap.add_argument("--min-count", type=int, default=MIN_COUNT)
+    args = ap.parse_args()
+    out_dir = Path(args.cube).parent
+    t0 = time.perf_counter()
+    stats = trend_stats(pl.read_parquet(args.cube, columns=["year","lemma","n"]), args.window)
+    stats.write_parquet(out_dir / "out_trend_stats.parquet")
+    table = rising_falling(stats, args.top, args.min_count)
+    table.write_parquet(out_dir / "out_rising_falling.parquet")
+    print(f"Scored {stats.height} lemmas in {time.perf_counter() - t0:.1f}s")
+    print("Wrote:", out_dir / "out_trend_stats.parquet")
+    print("Wrote:", out_dir / "out_rising_falling.parquet")
+    with pl.Config(tbl_rows=20):
+        print(table.group_by("direction", maintain_order=True).head(10))
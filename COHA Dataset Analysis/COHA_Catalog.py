@@ -0,0 +1,285 @@
+# COHA_Catalog.py
+# Persistent catalog of the COHA export: one row per Parquet/CSV file under BASE
+# with its size, mtime, columns, row count and tokens/words/texts class.
+# The catalog is written next to the data and refreshed incrementally, so only
+# files whose size or mtime changed since the last run get their footer/header
+# re-read. build_*_lazy turn catalog rows straight into normalized lazy frames.
+from pathlib import Path
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import polars as pl
+
+CATALOG_NAME = ".coha_catalog.parquet"
+SUFFIXES = (".parquet", ".csv")
+# Generated next to the data by the pipeline's own scripts: never corpus inputs
+OUTPUT_DIRS = {
+    "COHA_partials", "COHA_compact", "COHA_sketches", "COHA_store", "COHA_index",
+    "COHA_ngrams", "COHA_vectors", "COHA_colloc_cache",
+}
+OUTPUT_PREFIX = "out_"
+
+# Lower-cased column names used to recognise each kind of shard
+TEXTID_KEYS = ("textid","text_id","docid","doc_id")
+WORDID_KEYS = ("wordid","word_id")
+WORDISH_KEYS = ("word","token","form","lemma","pos","upos","xpos","tag")
+YEARISH_KEYS = ("year","date_year","decade","genre","section")
+
+CATALOG_SCHEMA = {
+    "path": pl.Utf8,
+    "size": pl.Int64,
+    "mtime_ns": pl.Int64,
+    "columns": pl.List(pl.Utf8),       # column names as written in the file
+    "norm_columns": pl.List(pl.Utf8),  # lower-cased, used for classification
+    "dtypes": pl.List(pl.Utf8),
+    "rows": pl.Int64,                  # from the Parquet footer; null for CSV
+    "kind": pl.Utf8,                   # "tokens" / "words" / "texts" / null
+}
+
+def classify(names):
+    names = [n.lower() for n in names]
+    has_textid = any(n in names for n in TEXTID_KEYS)
+    has_wordid = any(n in names for n in WORDID_KEYS)
+    has_wordish = any(n in names for n in WORDISH_KEYS)
+    has_yearish = any(n in names for n in YEARISH_KEYS)
+
+    # tokens: textID + wordID present, and no word/lemma/pos columns
+    if has_textid and has_wordid and not (has_wordish or has_yearish):
+        return "tokens"
+    # words/lexicon: wordID + (word/lemma/pos) present, and no textID
+    if has_wordid and has_wordish and not has_textid:
+        return "words"
+    # texts/metadata: textID + (year/genre/decade) present, and no wordID
+    if has_textid and has_yearish and not has_wordid:
+        return "texts"
+    return None
+
+def scan_file(path):
+    path = str(path)
+    if path.lower().endswith(".csv"):
+        return pl.scan_csv(path, has_header=True, infer_schema_length=1000)
+    return pl.scan_parquet(path)
+
+def probe(path):
+    # Footer (Parquet) or header (CSV) only -- never reads the data pages
+    lf = scan_file(path)
+    sch = lf.collect_schema()
+    rows = None
+    if not str(path).lower().endswith(".csv"):
+        rows = lf.select(pl.len()).collect().item()
+    return sch.names(), [str(t) for t in sch.dtypes()], rows
+
+def _probe_or_empty(path):
+    try:
+        return probe(path)
+    except Exception:
+        return [], [], None
+
+def probe_many(paths, workers=16):
+    # Footer reads are I/O bound and polars releases the GIL, so a bounded
+    # thread pool overlaps them; results come back in the order of `paths`.
+    paths = list(paths)
+    if workers <= 1 or len(paths) <= 1:
+        return [_probe_or_empty(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_probe_or_empty, paths))
+
+def walk_files(base):
+    for root, dirs, files in os.walk(base):
+        dirs[:] = [
+            d for d in dirs
+            if not d.startswith(".") and d not in OUTPUT_DIRS and not d.endswith(".staging")
+        ]
+        for f in files:
+            if f.lower().endswith(SUFFIXES) and f != CATALOG_NAME and not f.startswith(OUTPUT_PREFIX):
+                yield Path(root) / f
+
+def load_catalog(catalog_path):
+    if Path(catalog_path).exists():
+        try:
+            return pl.read_parquet(catalog_path)
+        except Exception:
+            pass
+    return pl.DataFrame(schema=CATALOG_SCHEMA)
+
+def make_entry(path, st, names, dtypes, rows):
+    return {
+        "path": str(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "columns": list(names),
+        "norm_columns": [n.lower() for n in names],
+        "dtypes": list(dtypes),
+        "rows": rows,
+        "kind": classify(names),
+    }
+
+def refresh_catalog(base, catalog_path=None, workers=16, verbose=True):
+    """
+    Walk `base` once, reuse catalog rows whose size and mtime are unchanged,
+    probe new/changed files in parallel, drop removed ones, and persist the result.
+    """
+    base = Path(base)
+    catalog_path = Path(catalog_path) if catalog_path else base / CATALOG_NAME
+    old = {r["path"]: r for r in load_catalog(catalog_path).iter_rows(named=True)}
+
+    entries, pending = [], []
+    for p in walk_files(base):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        prev = old.pop(str(p), None)
+        if prev is not None and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+            entries.append(prev)
+        else:
+            pending.append((p, st))
+
+    for (p, st), (names, dtypes, rows) in zip(pending, probe_many([p for p, _ in pending], workers)):
+        entries.append(make_entry(p, st, names, dtypes, rows))
+    probed = len(pending)
+
+    catalog = pl.DataFrame(entries, schema=CATALOG_SCHEMA).sort("path")
+    if probed or old or not catalog_path.exists():
+        catalog.write_parquet(catalog_path)
+    if verbose:
+        print(f"Catalog: {catalog.height} files ({probed} probed, {len(old)} removed) -> {catalog_path}")
+    return catalog
+
+# ---- lookups ----
+def _glob_regex(pattern):
+    # Same semantics as glob(..., recursive=True): "**/" spans any number of dirs
+    out, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(out) + r"\Z")
+
+def catalog_glob(catalog, pattern):
+    rx = _glob_regex(str(pattern))
+    return [e for e in catalog.iter_rows(named=True) if rx.match(e["path"])]
+
+def catalog_entries(catalog, kind=None, under=None, suffix=None):
+    rows = catalog
+    if kind is not None:
+        rows = rows.filter(pl.col("kind") == kind)
+    if under is not None:
+        rows = rows.filter(pl.col("path").str.starts_with(str(Path(under)) + os.sep))
+    if suffix is not None:
+        rows = rows.filter(pl.col("path").str.to_lowercase().str.ends_with(suffix))
+    return list(rows.iter_rows(named=True))
+
+def scan_entries(entries):
+    # One scan per distinct (format, columns, dtypes) group instead of one per file
+    groups = {}
+    for e in entries:
+        key = (e["path"].lower().endswith(".csv"), tuple(e["columns"]), tuple(e["dtypes"]))
+        groups.setdefault(key, []).append(e["path"])
+    out = []
+    for (is_csv, columns, dtypes), paths in groups.items():
+        if is_csv:
+            lf = pl.scan_csv(paths, has_header=True, infer_schema_length=1000)
+        else:
+            lf = pl.scan_parquet(paths)
+        out.append((lf, list(columns), dict(zip(columns, dtypes))))
+    return out
+
+def int_key(name, dtype, alias):
+    # textID/wordID are integers in most shards but strings in some exports.
+    # The catalogued dtype decides the conversion once, when the scan is built,
+    # so every later join runs on native Int64 keys.
+    col = pl.col(name)
+    if dtype in ("String", "Utf8"):
+        col = col.str.strip_chars().cast(pl.Int64, strict=False)
+    return col.cast(pl.Int64).alias(alias)
+
+# ---- normalized lazy frames ----
+# Build normalized lazy frames from catalog rows (select/cast to align schemas).
+# Column names come from the catalog, so no footer is reopened here.
+def build_tokens_lazy(entries):
+    if not entries:
+        return None
+    norm = []
+    for lf, names, dtypes in scan_entries(entries):
+        cols = {c.lower(): c for c in names}
+        exprs = []
+        # textID
+        for k in ("textid","text_id","docid","doc_id"):
+            if k in cols:
+                exprs.append(int_key(cols[k], dtypes[cols[k]], "textID"))
+                break
+        # wordID
+        for k in ("wordid","word_id"):
+            if k in cols:
+                exprs.append(int_key(cols[k], dtypes[cols[k]], "wordID"))
+                break
+        # optional occurrence id
+        if "id" in cols:
+            exprs.append(pl.col(cols["id"]).cast(pl.Int64).alias("occID"))
+        norm.append(lf.select(exprs))
+    return norm[0] if len(norm)==1 else pl.concat(norm, how="vertical_relaxed")
+
+def build_words_lazy(entries):
+    if not entries:
+        return None
+    norm = []
+    for lf, names, dtypes in scan_entries(entries):
+        cols = {c.lower(): c for c in names}
+        exprs = []
+        # wordID
+        key = cols.get("wordid", cols.get("word_id"))
+        if key:
+            exprs.append(int_key(key, dtypes[key], "wordID"))
+        # surface word
+        for k in ("word","token","form"):
+            if k in cols:
+                exprs.append(pl.col(cols[k]).cast(pl.Utf8).alias("word"))
+                break
+        # lemma
+        if "lemma" in cols:
+            exprs.append(pl.col(cols["lemma"]).cast(pl.Utf8).alias("lemma"))
+        # pos
+        for k in ("pos","upos","xpos","tag"):
+            if k in cols:
+                exprs.append(pl.col(cols[k]).cast(pl.Utf8).alias("pos"))
+                break
+        norm.append(lf.select(exprs))
+    return norm[0] if len(norm)==1 else pl.concat(norm, how="vertical_relaxed")
+
+def build_texts_lazy(entries):
+    if not entries:
+        return None
+    norm = []
+    for lf, names, dtypes in scan_entries(entries):
+        cols = {c.lower(): c for c in names}
+        exprs = []
+        # textID
+        for k in ("textid","text_id","docid","doc_id"):
+            if k in cols:
+                exprs.append(int_key(cols[k], dtypes[cols[k]], "textID"))
+                break
+        # year or date_year
+        if "year" in cols:
+            exprs.append(pl.col(cols["year"]).cast(pl.Int32).alias("year"))
+        elif "date_year" in cols:
+            exprs.append(pl.col(cols["date_year"]).cast(pl.Int32).alias("year"))
+        # decade (optional)
+        if "decade" in cols:
+            exprs.append(pl.col(cols["decade"]).cast(pl.Int32).alias("decade"))
+        # genre/section (optional)
+        for k in ("genre","section"):
+            if k in cols:
+                exprs.append(pl.col(cols[k]).cast(pl.Utf8).alias("genre"))
+                break
+        norm.append(lf.select(exprs))
+    return norm[0] if len(norm)==1 else pl.concat(norm, how="vertical_relaxed")
@@ -0,0 +1,183 @@
+# COHA_Collocations.py
+# Windowed collocation statistics for many target lemmas at once, per decade.
+#
+# Co-occurrences are counted over the compact corpus store (COHA_Store.py) with
+# shifted-array comparisons: for every offset k in 1..window the lemma array is
+# compared against itself shifted by k, keeping pairs inside the same text whose
+# left or right member is a target. Unigram frequencies per decade come out of
+# the same pass. Scores per (decade, target, collocate):
+#
+#   expected       E = f_target * f_collocate * span / N        (span = 2 * window)
+#   pmi            log2(O / E)
+#   t_score        (O - E) / sqrt(O)
+#   dice           2 * O / (f_target + f_collocate)
+#   log_likelihood G2 over the 2x2 table of target-window slots vs. collocate
+#
+# Results are cached per (target set, window, unit, decade), in memory and as
+# Parquet under CACHE_DIR, so repeating a query does no corpus work at all. The
+# key includes the store's version, so a rebuilt store is never served old results.
+from pathlib import Path
+import argparse
+import hashlib
+import time
+import numpy as np
+import polars as pl
+
+from COHA_Store import BASE, STORE_DIR, NULL_CODE, NULL_INT, open_store, text_chunks, text_decades
+
+CACHE_DIR = BASE / "COHA_colloc_cache"
+CHUNK_TOKENS = 20_000_000
+_memory_cache = {}
+
+def _store_version(store_dir):
+    # Size and mtime of the files every rebuild rewrites
+    stats = [(Path(store_dir) / f).stat() for f in ("store.json", "offsets.npy", "tokens.npy")]
+    return ",".join(f"{st.st_size}:{st.st_mtime_ns}" for st in stats)
+
+def _cache_key(targets, window, unit, version=""):
+    h = hashlib.sha1(f"{version}|{unit}|{window}|{'|'.join(sorted(set(targets)))}".encode()).hexdigest()[:16]
+    return h
+
+def count_cooccurrences(store, target_codes, window, decades, unit="lemma", chunk_tokens=CHUNK_TOKENS):
+    codes_by_word, _ = store["lexicon"][unit]
+    text_decade = text_decades(store)
+    wanted = np.asarray(sorted(decades), dtype=text_decade.dtype) if decades is not None else None
+    offsets = store["offsets"]
+    pair_parts, freq_parts = [], []
+    for t0, t1 in text_chunks(offsets, chunk_tokens):
+        a, b = int(offsets[t0]), int(offsets[t1])
+        tokens = store["tokens"][a:b]
+        ids = np.full(len(tokens), NULL_CODE, dtype=np.uint32)
+        ok = tokens < len(codes_by_word)
+        ids[ok] = codes_by_word[tokens[ok]]
+        text_of = np.repeat(np.arange(t0, t1), np.diff(offsets[t0:t1 + 1]))
+        dec = text_decade[text_of]
+        live = (dec != NULL_INT) & (ids != NULL_CODE)
+        if wanted is not None:
+            live &= np.isin(dec, wanted)
+        freq_parts.append(
+            pl.DataFrame({"decade": dec[live], "code": ids[live]})
+            .group_by(["decade","code"]).agg(pl.len().alias("f"))
+        )
+        is_target = live & np.isin(ids, target_codes)
+        tgt, col, dcs = [], [], []
+        for k in range(1, window + 1):
+            same = text_of[:-k] == text_of[k:]
+            # target on the left, collocate k to its right
+            m = is_target[:-k] & same & live[k:]
+            tgt.append(ids[:-k][m]); col.append(ids[k:][m]); dcs.append(dec[:-k][m])
+            # target on the right, collocate k to its left
+            m = is_target[k:] & same & live[:-k]
+            tgt.append(ids[k:][m]); col.append(ids[:-k][m]); dcs.append(dec[k:][m])
+        if tgt:
+            pair_parts.append(
+                pl.DataFrame({"decade": np.concatenate(dcs), "target": np.concatenate(tgt), "collocate": np.concatenate(col)})
+                .group_by(["decade","target","collocate"]).agg(pl.len().alias("o11"))
+            )
+    if not freq_parts:
+        empty = {"decade": pl.Int32, "target": pl.UInt32, "collocate": pl.UInt32}
+        return pl.DataFrame(schema={**empty, "o11": pl.UInt32}), pl.DataFrame(schema={"decade": pl.Int32, "code": pl.UInt32, "f": pl.UInt32})
+    pairs = pl.concat(pair_parts).group_by(["decade","target","collocate"]).agg(pl.col("o11").sum())
+    freqs = pl.concat(freq_parts).group_by(["decade","code"]).agg(pl.col("f").sum())
+    return pairs, freqs
+
+def score(pairs, freqs, window):
+    span = 2 * window
+    totals = freqs.group_by("decade").agg(pl.col("f").sum().alias("n_decade"))
+    f = freqs.rename({"code": "target", "f": "f_target"})
+    df = (
+        pairs
+        .join(f, on=["decade","target"], how="left")
+        .join(freqs.rename({"code": "collocate", "f": "f_collocate"}), on=["decade","collocate"], how="left")
+        .join(totals, on="decade", how="left")
+    )
+    o11 = pl.col("o11").cast(pl.Float64)
+    r1 = pl.col("f_target").cast(pl.Float64) * span   # window slots around the target
+    c1 = pl.col("f_collocate").cast(pl.Float64)
+    n = pl.col("n_decade").cast(pl.Float64)
+    o12 = (r1 - o11).clip(lower_bound=0)
+    o21 = (c1 - o11).clip(lower_bound=0)
+    o22 = (n - o11 - o12 - o21).clip(lower_bound=0)
+    r2, c2 = o21 + o22, o12 + o22
+    tot = o11 + o12 + o21 + o22
+
+    def g2_term(o, e):
+        return pl.when(o > 0).then(o * (o / e).log()).otherwise(0.0)
+
+    expected = r1 * c1 / n
+    return df.with_columns(expected.alias("expected")).with_columns(
+        (o11 / pl.col("expected")).log(2).alias("pmi"),
+        (2 * (
+            g2_term(o11, r1 * c1 / tot) + g2_term(o12, r1 * c2 / tot)
+            + g2_term(o21, r2 * c1 / tot) + g2_term(o22, r2 * c2 / tot)
+        )).alias("log_likelihood"),
+        (2 * o11 / (pl.col("f_target") + c1)).alias("dice"),
+        ((o11 - pl.col("expected")) / o11.sqrt()).alias("t_score"),
+    )
+
+def collocations(targets, window=5, decades=None, unit="lemma", min_count=3, store_dir=STORE_DIR, cache_dir=None):
+    """
+    Collocates of every lemma in `targets` within +-window tokens, per decade.
+    `decades` limits the pass (e.g. [1900, 1910]); None means every decade.
+    """
+    if window < 1:
+        raise ValueError(f"window must be at least 1 token, got {window}")
+    cache_dir = Path(cache_dir) if cache_dir else Path(store_dir).parent / "COHA_colloc_cache"
+    key = _cache_key(targets, window, unit, _store_version(store_dir))
+    store = open_store(store_dir)
+    all_decades = sorted(int(d) for d in np.unique(text_decades(store)) if d != NULL_INT)
+    decades = sorted(decades) if decades is not None else all_decades
+
+    frames, missing = {}, []
+    for d in decades:
+        path = cache_dir / key / f"decade={d}.parquet"
+        if (key, d) in _memory_cache:
+            frames[d] = _memory_cache[(key, d)]
+        elif path.exists():
+            frames[d] = _memory_cache[(key, d)] = pl.read_parquet(path)
+        else:
+            missing.append(d)
+
+    if missing:
+        dictionary = store["lexicon"][unit][1]
+        lookup = {t: i for i, t in enumerate(dictionary)}
+        target_codes = np.asarray([lookup[t] for t in set(targets) if t in lookup], dtype=np.uint32)
+        pairs, freqs = count_cooccurrences(store, target_codes, window, missing, unit)
+        names = pl.Series(dictionary, dtype=pl.Utf8)
+        scored = score(pairs, freqs, window).with_columns(
+            pl.lit(names).gather(pl.col("target")).alias("target"),
+            pl.lit(names).gather(pl.col("collocate")).alias("collocate"),
+        )
+        (cache_dir / key).mkdir(parents=True, exist_ok=True)
+        for d in missing:
+            part = scored.filter(pl.col("decade") == d).drop("decade")
+            part.write_parquet(cache_dir / key / f"decade={d}.parquet")
+            frames[d] = _memory_cache[(key, d)] = part
+
+    out = [f.with_columns(pl.lit(d, dtype=pl.Int32).alias("decade")) for d, f in frames.items()]
+    if not out:
+        return pl.DataFrame()
+    return (
+        pl.concat(out, how="diagonal_relaxed")
+        .filter(pl.col("o11") >= min_count)
+        .select(["decade","target","collocate", pl.exclude(["decade","target","collocate"])])
+        .sort(["decade","target","log_likelihood"], descending=[False, False, True])
+    )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Collocates of target lemmas per decade from the COHA store")
+    ap.add_argument("targets", nargs="+")
+    ap.add_argument("--window", type=int, default=5)
+    ap.add_argument("--decades", type=int, nargs="*")
+    ap.add_argument("--min-count", type=int, default=3)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--store", default=str(STORE_DIR))
+    args = ap.parse_args()
+    if args.window < 1:
+        ap.error(f"--window must be at least 1, got {args.window}")
+    t0 = time.perf_counter()
+    res = collocations(args.targets, args.window, args.decades, min_count=args.min_count, store_dir=args.store)
+    print(f"{res.height} collocate rows in {time.perf_counter() - t0:.2f}s")
+    with pl.Config(tbl_rows=60):
+        print(res.group_by(["decade","target"], maintain_order=True).head(args.top))
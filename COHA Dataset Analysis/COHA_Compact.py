@@ -0,0 +1,110 @@
+# COHA_Compact.py
+# One-time compaction of the COHA token stream, already joined with the lexicon
+# and texts metadata, into hive-partitioned Parquet:
+#
+#   COMPACT_DIR/decade=1990/genre=NEWS/year=1995/part-0.parquet
+#
+# Each file is sorted by lemma and written in small row groups with min/max
+# statistics, so polars' predicate pushdown skips whole partitions for
+# year/decade/genre filters and whole row groups for lemma filters.
+#
+# Two passes keep memory bounded by one shard or one partition, never the corpus:
+#   1. each token shard is joined and split into per-partition staging pieces
+#   2. each partition's pieces are merged, sorted by lemma and written out
+from pathlib import Path
+from urllib.parse import quote
+import shutil
+import sys
+import time
+import polars as pl
+
+from COHA_Catalog import build_tokens_lazy
+from COHA_Stream import BASE, load_frames, token_shards, build_lookups, apply_lookups
+
+COMPACT_DIR = BASE / "COHA_compact"
+ROW_GROUP_SIZE = 64_000
+PARTITION_KEYS = ["decade","genre","year"]
+HIVE_SCHEMA = {"decade": pl.Int32, "genre": pl.Utf8, "year": pl.Int32}
+
+def _hive_dir(root, keys):
+    parts = []
+    for k, v in zip(PARTITION_KEYS, keys):
+        v = "__HIVE_DEFAULT_PARTITION__" if v is None else quote(str(v), safe="")
+        parts.append(f"{k}={v}")
+    return root.joinpath(*parts)
+
+def stage_shards(base, stage_dir):
+    lf_tokens, lf_words, lf_texts = load_frames(base)
+    lookups = build_lookups(lf_words, lf_texts)
+    shards = token_shards(base)
+    for i, entry in enumerate(shards):
+        df = (
+            apply_lookups(build_tokens_lazy([entry]), lookups)
+            .with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+            .collect()
+        )
+        for c in PARTITION_KEYS:
+            if c not in df.columns:
+                df = df.with_columns(pl.lit(None, dtype=HIVE_SCHEMA[c]).alias(c))
+        for keys, part in df.partition_by(PARTITION_KEYS, as_dict=True).items():
+            d = _hive_dir(stage_dir, keys)
+            d.mkdir(parents=True, exist_ok=True)
+            part.drop(PARTITION_KEYS).write_parquet(d / f"shard-{i:05d}.parquet")
+        print(f"  staged shard {i+1}/{len(shards)}: {df.height} tokens")
+
+def merge_partitions(stage_dir, out_dir):
+    leaves = sorted({p.parent for p in stage_dir.rglob("*.parquet")})
+    for leaf in leaves:
+        df = pl.read_parquet(leaf / "*.parquet")
+        order = [c for c in ("lemma","textID","occID") if c in df.columns]
+        target = out_dir / leaf.relative_to(stage_dir)
+        target.mkdir(parents=True, exist_ok=True)
+        df.sort(order).write_parquet(
+            target / "part-0.parquet",
+            row_group_size=ROW_GROUP_SIZE,
+            statistics=True,
+        )
+    return len(leaves)
+
+def compact_dir(base=BASE):
+    # The one default for writer and reader: COMPACT_DIR, or its name under another base.
+    # Looked up at call time, so overriding COMPACT_DIR moves both.
+    base = Path(base)
+    return COMPACT_DIR if base.resolve() == BASE.resolve() else base / COMPACT_DIR.name
+
+def compact(base=BASE, out_dir=None):
+    base = Path(base)
+    out_dir = Path(out_dir) if out_dir else compact_dir(base)
+    stage_dir = out_dir.with_name(out_dir.name + ".staging")
+    for d in (out_dir, stage_dir):
+        if d.exists():
+            shutil.rmtree(d)
+    t0 = time.perf_counter()
+    stage_shards(base, stage_dir)
+    n = merge_partitions(stage_dir, out_dir)
+    shutil.rmtree(stage_dir)
+    print(f"Wrote {n} partitions to {out_dir} in {time.perf_counter() - t0:.1f}s")
+    return out_dir
+
+def scan_compacted(out_dir=None):
+    out_dir = Path(out_dir) if out_dir else compact_dir()
+    return pl.scan_parquet(
+        str(out_dir / "**/*.parquet"),
+        hive_partitioning=True,
+        hive_schema=HIVE_SCHEMA,
+    )
+
+
+if __name__ == "__main__":
+    base = Path(sys.argv[1]) if len(sys.argv) > 1 else BASE
+    out = compact(base)
+    # e.g. the democracy trend now only touches row groups whose lemma range covers it
+    print(
+        scan_compacted(out)
+        .filter(pl.col("lemma") == "democracy")
+        .group_by("year")
+        .agg(pl.len().alias("n"))
+        .sort("year")
+        .collect()
+        .head(10)
+    )
@@ -0,0 +1,176 @@
+# COHA_Cube.py
+# Incremental maintenance of the year x word x lemma x pos (x genre) count cube.
+# Every token shard gets its own partial aggregate in PARTIALS_DIR, tracked by a
+# manifest of (shard path, size, mtime, lookup fingerprint). A refresh recomputes
+# partials only for added/changed shards, drops those of removed shards, and
+# rebuilds the cube and the out_* products (Parquet + Arrow IPC) by merging
+# the partials.
+# Changing the lexicon or the texts metadata invalidates every partial.
+from pathlib import Path
+import hashlib
+import sys
+import time
+import polars as pl
+
+from COHA_Catalog import refresh_catalog, catalog_entries, build_tokens_lazy
+from COHA_Stream import BASE, load_frames, token_shards, build_lookups, apply_lookups
+from COHA_TopK import top_k_per_group
+from COHA_IPC import write_sorted_ipc
+
+CUBE_KEYS = ("year","word","lemma","pos","genre")
+TOP_K = 50
+PARTIALS_DIR = BASE / "COHA_partials"
+MANIFEST_NAME = "manifest.parquet"
+MANIFEST_SCHEMA = {
+    "path": pl.Utf8,
+    "size": pl.Int64,
+    "mtime_ns": pl.Int64,
+    "lookup_fp": pl.Utf8,
+    "partial": pl.Utf8,     # file stem of the shard's outputs
+    "rows": pl.Int64,
+}
+
+# ---- products (shared with COHA_Analysis.py) ----
+def rollup(cube, keys):
+    return cube.lazy().group_by(keys).agg(pl.col("n").sum().alias("n"))
+
+def product_frames(cube):
+    # (stem, frame) for every product the cube supports, built one at a time
+    names = set(cube.columns)
+    if "year" in names:
+        yield "out_year_totals", rollup(cube, ["year"]).collect()
+    if {"year","word"}.issubset(names):
+        yield "out_by_year_word", rollup(cube, ["year","word"]).collect()
+    if {"year","lemma","pos"}.issubset(names):
+        yield "out_by_year_lemma_pos", rollup(cube, ["year","lemma","pos"]).collect()
+    # Top 50 lemmas per year (and per decade / genre), via bounded heaps. The
+    # roll-ups are passed lazily and collected once inside top_k_per_group;
+    # they are far smaller than the cube, which is already in memory.
+    if {"year","lemma"}.issubset(names):
+        yield "out_top50_lemmas_per_year", top_k_per_group(
+            rollup(cube, ["year","lemma"]), by="year", value="n", k=TOP_K
+        )
+        by_decade = rollup(cube.with_columns((pl.col("year") // 10 * 10).alias("decade")), ["decade","lemma"])
+        yield "out_top50_lemmas_per_decade", top_k_per_group(by_decade, by="decade", value="n", k=TOP_K)
+    if {"genre","lemma"}.issubset(names):
+        yield "out_top50_lemmas_per_genre", top_k_per_group(
+            rollup(cube, ["genre","lemma"]), by="genre", value="n", k=TOP_K
+        )
+
+def write_products(cube, out_dir):
+    # Each product as Parquet plus a sorted, uncompressed Arrow IPC copy for
+    # the memory-mapped readers in COHA_IPC.py
+    written = []
+    for stem, df in product_frames(cube):
+        df.write_parquet(out_dir / f"{stem}.parquet")
+        written += [out_dir / f"{stem}.parquet", write_sorted_ipc(df, out_dir / f"{stem}.arrow")]
+    for p in written:
+        print("Wrote:", p)
+    return written
+
+# ---- per-shard partials ----
+def lookup_fingerprint(catalog):
+    # Partials depend on the lexicon and texts as well as on the shard itself
+    h = hashlib.sha1()
+    for kind in ("words","texts"):
+        for e in catalog_entries(catalog, kind=kind):
+            h.update(f"{e['path']}|{e['size']}|{e['mtime_ns']}\n".encode())
+    return h.hexdigest()
+
+def shard_partial(entry, lookups):
+    lf = apply_lookups(build_tokens_lazy([entry]), lookups)
+    keys = [c for c in CUBE_KEYS if c in lf.collect_schema().names()]
+    return (
+        lf.group_by(keys)
+        .agg(pl.len().alias("n"))
+        .collect()
+        .with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+    )
+
+def load_manifest(partials_dir):
+    p = partials_dir / MANIFEST_NAME
+    return pl.read_parquet(p) if p.exists() else pl.DataFrame(schema=MANIFEST_SCHEMA)
+
+def shard_files(manifest, out_dir, name):
+    return [str(out_dir / f"{stem}.{name}.parquet") for stem in manifest["partial"]]
+
+def refresh_shard_outputs(base, out_dir, compute, names, label="Partials", salt=""):
+    """
+    Keep one set of per-shard outputs in `out_dir` in step with the token shards.
+    `compute(entry, lookups)` returns {name: DataFrame} for one shard and is only
+    called for added/changed shards (or for all of them after a lookup change, or
+    when `salt` -- the caller's parameters -- changes).
+    """
+    base, out_dir = Path(base), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    catalog = refresh_catalog(base, verbose=False)
+    fp = lookup_fingerprint(catalog)
+    if salt:
+        fp = hashlib.sha1(f"{fp}|{salt}".encode()).hexdigest()
+    old = {r["path"]: r for r in load_manifest(out_dir).iter_rows(named=True)}
+
+    lookups, rows, recomputed = None, [], 0
+    for e in token_shards(base, catalog):
+        prev = old.pop(e["path"], None)
+        if (
+            prev is not None
+            and (prev["size"], prev["mtime_ns"], prev["lookup_fp"]) == (e["size"], e["mtime_ns"], fp)
+            and all((out_dir / f"{prev['partial']}.{n}.parquet").exists() for n in names)
+        ):
+            rows.append(prev)
+            continue
+        if lookups is None:
+            _, lf_words, lf_texts = load_frames(base, catalog)
+            lookups = build_lookups(lf_words, lf_texts)
+        stem = hashlib.sha1(e["path"].encode()).hexdigest()[:16]
+        outputs = compute(e, lookups)
+        for n, df in outputs.items():
+            df.write_parquet(out_dir / f"{stem}.{n}.parquet")
+        rows.append({
+            "path": e["path"], "size": e["size"], "mtime_ns": e["mtime_ns"],
+            "lookup_fp": fp, "partial": stem, "rows": sum(df.height for df in outputs.values()),
+        })
+        recomputed += 1
+
+    for prev in old.values():
+        for n in names:
+            (out_dir / f"{prev['partial']}.{n}.parquet").unlink(missing_ok=True)
+    manifest = pl.DataFrame(rows, schema=MANIFEST_SCHEMA)
+    manifest.write_parquet(out_dir / MANIFEST_NAME)
+    print(f"{label}: {manifest.height} shards ({recomputed} recomputed, {len(old)} removed)")
+    return manifest, out_dir
+
+def default_partials_dir(base=BASE):
+    # PARTIALS_DIR, or its name under another base; looked up at call time so
+    # overriding the constant is honoured
+    base = Path(base)
+    return PARTIALS_DIR if base.resolve() == BASE.resolve() else base / PARTIALS_DIR.name
+
+def refresh_partials(base=BASE, partials_dir=None):
+    partials_dir = Path(partials_dir) if partials_dir else default_partials_dir(base)
+    return refresh_shard_outputs(base, partials_dir, lambda e, lookups: {"cube": shard_partial(e, lookups)}, ["cube"])
+
+def merge_partials(manifest, partials_dir):
+    lf = pl.concat([pl.scan_parquet(f) for f in shard_files(manifest, partials_dir, "cube")], how="diagonal_relaxed")
+    keys = [c for c in CUBE_KEYS if c in lf.collect_schema().names()]
+    return lf.group_by(keys).agg(pl.col("n").sum().alias("n")).collect(streaming=True)
+
+def refresh_cube(base=BASE, out_dir=None):
+    base = Path(base)
+    out_dir = Path(out_dir) if out_dir else base
+    manifest, partials_dir = refresh_partials(base)
+    if manifest.height == 0:
+        print("No token shards found.")
+        return None
+    cube = merge_partials(manifest, partials_dir)
+    cube.write_parquet(out_dir / "out_count_cube.parquet")
+    print(f"Wrote: {out_dir / 'out_count_cube.parquet'} ({cube.height} cells)")
+    write_products(cube, out_dir)
+    return cube
+
+
+if __name__ == "__main__":
+    base = Path(sys.argv[1]) if len(sys.argv) > 1 else BASE
+    t0 = time.perf_counter()
+    refresh_cube(base)
+    print(f"Refreshed in {time.perf_counter() - t0:.2f}s")
@@ -1,21 +1,22 @@
 from pathlib import Path
 import polars as pl
 
+from COHA_Survey import survey_tree
+
 BASE = Path("/Users/christopherjorgensen/Downloads/Corpus")
-paths = list(BASE.rglob("*.parquet"))
 
-def has_any(schema, names):
-    n = [n.lower() for n in schema.names()]
-    return any(x in n for x in names)
+# Every footer is surveyed in parallel, so there is no need to stop at a subset
+table = survey_tree(BASE)
+
+for r in table.filter(~pl.col("error")).iter_rows(named=True):
+    sch = dict(zip(r["columns"], r["dtypes"]))
+    if r["fulltext_candidate"]:
+        print("FULL-TEXT CANDIDATE:", r["path"], sch)
+    if r["lexicon_candidate"]:
+        print("WORDS/LEXICON CANDIDATE:", r["path"], sch)
+    if r["metadata_candidate"]:
+        print("TEXT METADATA CANDIDATE:", r["path"], sch)
 
-for p in paths[:200]:  # scan a subset; bump if needed
-    try:
-        sch = pl.scan_parquet(str(p)).collect_schema()
-        if has_any(sch, ["text","body","content","full_text"]):
-            print("FULL-TEXT CANDIDATE:", p, sch)
-        if has_any(sch, ["lemma","word","pos","tag"]):
-            print("WORDS/LEXICON CANDIDATE:", p, sch)
-        if has_any(sch, ["year","decade","genre","section"]):
-            print("TEXT METADATA CANDIDATE:", p, sch)
-    except Exception:
-        pass
\ No newline at end of file
+if not table.filter(~pl.col("error") & pl.col("fulltext_candidate")).height:
+    # The usual export is tokens + lexicon + sources; the texts can be rebuilt from those
+    print("No full-text column; rebuild the texts with: python COHA_Documents.py docs.jsonl")
@@ -0,0 +1,152 @@
+# COHA_Documents.py
+# Running text back out of the token / lexicon / metadata triple.
+#
+#   python COHA_Documents.py docs.jsonl                  # every text, JSONL
+#   python COHA_Documents.py docs --format parquet       # docs/part-00000.parquet, ...
+#   python COHA_Documents.py docs.jsonl --years 1900 1909 --genres NEWS
+#   python COHA_Documents.py docs.jsonl --base /data/coha        # another corpus
+#
+# Texts come from the compact corpus store (COHA_Store.py, built from the token
+# shards on first use), where each textID's wordIDs already sit in occID order.
+# Words are joined with detokenization rules: no space before closing
+# punctuation and clitics ('s, n't, ...), none after opening brackets, straight
+# double quotes alternate between opening and closing, <p> becomes a paragraph
+# break and runs of the @ redaction tokens collapse to one "@@@". Documents are
+# yielded one at a time and written in batches of BATCH_DOCS, so the corpus is
+# never in memory as a whole.
+from pathlib import Path
+import argparse
+import json
+import time
+import numpy as np
+import polars as pl
+
+from COHA_Store import BASE, STORE_DIR, NULL_CODE, NULL_INT, open_store, build_store, text_column, text_decades, text_meta
+
+BATCH_DOCS = 1_000
+NO_SPACE_BEFORE = {".", ",", ";", ":", "!", "?", "%", ")", "]", "}", "...", "'s", "'", "n't", "'re", "'ve", "'ll", "'d", "'m"}
+NO_SPACE_AFTER = {"(", "[", "{", "$", "#"}
+PARAGRAPH = "<p>"
+REDACTED = "@"
+
+def word_tables(store):
+    # Per-wordID strings and spacing flags, computed once per store
+    codes, dictionary = store["lexicon"]["word"]
+    idx = np.where(codes == NULL_CODE, len(dictionary), codes)
+    lower = [w.lower() for w in dictionary] + [""]
+    return {
+        "words": np.asarray(dictionary + [""], dtype=object)[idx],
+        "before": np.asarray([w in NO_SPACE_BEFORE for w in lower])[idx],
+        "after": np.asarray([w in NO_SPACE_AFTER for w in lower])[idx],
+    }
+
+def detokenize(tables, word_ids):
+    ids = np.asarray(word_ids)
+    ids = ids[ids < len(tables["words"])]
+    space = np.ones(len(ids), dtype=bool)   # space before token i
+    if len(ids):
+        space &= ~tables["before"][ids]
+        space[1:] &= ~tables["after"][ids[:-1]]
+    out, quote_open, last = [], False, None
+    for w, sp in zip(tables["words"][ids].tolist(), space.tolist()):
+        if w == PARAGRAPH:
+            out.append("\n\n")
+            last = w
+            continue
+        if w == REDACTED and last == REDACTED:
+            continue
+        if w == '"':
+            # opening quotes keep the space before them, closing ones don't
+            sp = sp and not quote_open
+            quote_open = not quote_open
+        elif last == '"' and quote_open:
+            sp = False
+        if sp and out and out[-1] != "\n\n":
+            out.append(" ")
+        out.append("@@@" if w == REDACTED else w)
+        last = w
+    return "".join(out).strip()
+
+def _select_texts(store, text_ids, years, genres):
+    offsets = store["offsets"]
+    ids = np.arange(len(offsets) - 1) if text_ids is None else np.asarray(sorted(text_ids))
+    ids = ids[(ids >= 0) & (ids < len(offsets) - 1)]
+    ids = ids[offsets[ids + 1] > offsets[ids]]
+    meta = store["meta"]
+    if years is not None and "year" in meta:
+        year = np.asarray(text_column(store, "year"))[ids]
+        ids = ids[(year >= years[0]) & (year <= years[1])]
+    if genres is not None and "genre" in meta:
+        dictionary = meta["genre"][1]
+        wanted = [i for i, g in enumerate(dictionary) if g in set(genres)]
+        ids = ids[np.isin(np.asarray(text_column(store, "genre"))[ids], wanted)]
+    return ids
+
+def iter_documents(store_dir=STORE_DIR, text_ids=None, years=None, genres=None):
+    """
+    Yield {"textID", "year", "decade", "genre", "tokens", "text"} per text in
+    textID order. `years` is an inclusive (start, end) pair; `genres` an iterable.
+    """
+    store = open_store(store_dir)
+    tables = word_tables(store)
+    offsets, tokens, meta = store["offsets"], store["tokens"], store["meta"]
+    decades = text_decades(store) if "decade" in meta or "year" in meta else None
+    for t in _select_texts(store, text_ids, years, genres).tolist():
+        a, b = int(offsets[t]), int(offsets[t + 1])
+        decade = int(decades[t]) if decades is not None else NULL_INT
+        yield {
+            "textID": t,
+            "year": text_meta(store, t, "year") if "year" in meta else None,
+            "decade": decade if decade != NULL_INT else None,
+            "genre": text_meta(store, t, "genre") if "genre" in meta else None,
+            "tokens": b - a,
+            "text": detokenize(tables, tokens[a:b]),
+        }
+
+def batches(docs, size=BATCH_DOCS):
+    batch = []
+    for d in docs:
+        batch.append(d)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+DOC_SCHEMA = {"textID": pl.Int64, "year": pl.Int32, "decade": pl.Int32, "genre": pl.Utf8, "tokens": pl.Int64, "text": pl.Utf8}
+
+def write_documents(out, fmt="jsonl", store_dir=STORE_DIR, batch_docs=BATCH_DOCS, **select):
+    out = Path(out)
+    n = 0
+    if fmt == "jsonl":
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            for batch in batches(iter_documents(store_dir, **select), batch_docs):
+                f.write("".join(json.dumps(d, ensure_ascii=False) + "\n" for d in batch))
+                n += len(batch)
+    else:
+        out.mkdir(parents=True, exist_ok=True)
+        for old in out.glob("part-*.parquet"):
+            old.unlink()
+        for i, batch in enumerate(batches(iter_documents(store_dir, **select), batch_docs)):
+            pl.DataFrame(batch, schema=DOC_SCHEMA).write_parquet(out / f"part-{i:05d}.parquet")
+            n += len(batch)
+    return n
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Reconstruct COHA texts from the token shards")
+    ap.add_argument("out", help="JSONL file, or a directory for --format parquet")
+    ap.add_argument("--format", choices=["jsonl","parquet"], default="jsonl")
+    ap.add_argument("--years", type=int, nargs=2, metavar=("START","END"))
+    ap.add_argument("--genres", nargs="*")
+    ap.add_argument("--batch", type=int, default=BATCH_DOCS)
+    ap.add_argument("--base", default=str(BASE), help="corpus directory the store is built from if missing")
+    ap.add_argument("--store", help=f"store directory (default: <base>/{STORE_DIR.name})")
+    args = ap.parse_args()
+    store = Path(args.store) if args.store else Path(args.base) / STORE_DIR.name
+    if not (store / "store.json").exists():
+        build_store(args.base, store)
+    t0 = time.perf_counter()
+    n = write_documents(args.out, args.format, store, args.batch, years=args.years, genres=args.genres)
+    print(f"Wrote {n} documents to {args.out} in {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,72 @@
+# COHA_IPC.py
+# Uncompressed Arrow IPC copies of the cube products, and memory-mapped readers.
+#
+# write_products (COHA_Cube.py) writes every out_*.parquet product a second time
+# as out_*.arrow, uncompressed and sorted by its lookup key (IPC_KEYS). Opening
+# one maps the file instead of decompressing and copying it, so inspection
+# scripts start at once, and a lookup is a binary search on the sorted key
+# column followed by a zero-copy slice:
+#
+#   cube = open_ipc("out_by_year_lemma_pos.arrow")
+#   lookup(cube, "democracy")                  # every (year, pos) row of the lemma
+#   top = open_ipc("out_top50_lemmas_per_year.arrow")
+#   lookup_range(top, 1900, 1909)              # a decade of top-50 lists
+from pathlib import Path
+import polars as pl
+
+# product stem -> sort columns (the first one is the lookup key)
+IPC_KEYS = {
+    "out_by_year_lemma_pos": ["lemma","pos","year"],
+    "out_by_year_word": ["word","year"],
+    "out_top50_lemmas_per_year": ["year"],
+    "out_top50_lemmas_per_decade": ["decade"],
+    "out_top50_lemmas_per_genre": ["genre"],
+    "out_year_totals": ["year"],
+}
+
+def write_sorted_ipc(df, path):
+    path = Path(path)
+    keys = [c for c in IPC_KEYS[path.stem] if c in df.columns]
+    # stable sort: top-k lists keep their descending order inside each group
+    df.sort(keys, nulls_last=True, maintain_order=True).write_ipc(path, compression="uncompressed")
+    return path
+
+def open_ipc(path, key=None):
+    path = Path(path)
+    frame = pl.read_ipc(path, memory_map=True)
+    key = key or IPC_KEYS[path.stem][0]
+    return {"frame": frame, "key": key, "column": frame[key]}
+
+def lookup(table, value):
+    # Rows whose key equals `value`
+    col = table["column"]
+    lo = col.search_sorted(value, side="left")
+    hi = col.search_sorted(value, side="right")
+    return table["frame"].slice(lo, hi - lo)
+
+def lookup_range(table, start, end):
+    # Rows with start <= key <= end
+    col = table["column"]
+    lo = col.search_sorted(start, side="left")
+    hi = col.search_sorted(end, side="right")
+    return table["frame"].slice(lo, max(hi - lo, 0))
+
+def lemma_trend(cube, totals, lemma, pos=None):
+    """
+    Same rows as COHA_Trends.trends_frame for one lemma, read from the mapped
+    lemma cube and year totals instead of an in-memory index.
+    """
+    rows = lookup(cube, lemma)
+    if pos:
+        rows = rows.filter(pl.col("pos") == pos)
+    return (
+        rows.group_by("year").agg(pl.col("n").sum())
+        .join(totals["frame"], on="year", how="left", suffix="_total")
+        .select(
+            pl.lit(lemma).alias("lemma"),
+            pl.col("year").cast(pl.Int32),
+            pl.col("n").cast(pl.Int64),
+            (pl.col("n") * 1e6 / pl.col("n_total")).alias("per_million"),
+        )
+        .sort("year")
+    )
@@ -0,0 +1,203 @@
+# COHA_Index.py
+# Positional inverted index over the compact corpus store (COHA_Store.py) and
+# keyword-in-context queries on top of it.
+#
+# For each indexed column ("lemma" and "word") every dictionary code maps to the
+# ascending global positions of its tokens in tokens.npy; textID and in-text
+# position follow from the store's offsets. Posting lists are delta + varint
+# (LEB128) encoded into one byte file per column with an int64 pointer array:
+#
+#   COHA_index/lemma.postings   COHA_index/lemma.ptr.npy   (same for word)
+#
+# The build is a two-pass counting sort over fixed-size token chunks, so memory
+# stays bounded by CHUNK tokens plus one uint32/uint64 scratch file on disk.
+from pathlib import Path
+import sys
+import time
+import numpy as np
+
+from COHA_Store import BASE, STORE_DIR, NULL_CODE, open_store, decode, text_column
+
+INDEX_DIR = BASE / "COHA_index"
+COLUMNS = ("lemma","word")
+CHUNK = 50_000_000
+
+# ---- varint codec ----
+def varint_encode(values):
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    v = values >> np.uint64(7)
+    while v.any():
+        nbytes += v > 0
+        v >>= np.uint64(7)
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    starts = np.cumsum(nbytes) - nbytes
+    for k in range(int(nbytes.max()) if len(values) else 0):
+        live = nbytes > k
+        byte = (values[live] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[live] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[live] + k] = (byte | more).astype(np.uint8)
+    return out, nbytes
+
+def varint_decode(buf):
+    buf = np.asarray(buf, dtype=np.uint8)
+    if len(buf) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    last = buf < 0x80
+    ends = np.flatnonzero(last)
+    starts = np.r_[0, ends[:-1] + 1]
+    shift = np.arange(len(buf)) - np.repeat(starts, ends - starts + 1)
+    parts = (buf & 0x7F).astype(np.uint64) << (7 * shift).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+# ---- build ----
+def _term_codes(store, column, tokens):
+    codes, _ = store["lexicon"][column]
+    out = np.full(len(tokens), NULL_CODE, dtype=np.uint32)
+    ok = tokens < len(codes)
+    out[ok] = codes[tokens[ok]]
+    return out
+
+def build_column(store, column, out_dir, chunk=CHUNK):
+    tokens = store["tokens"]
+    total = len(tokens)
+    n_terms = len(store["lexicon"][column][1])
+
+    # Pass 1: postings per term (null codes are skipped)
+    counts = np.zeros(n_terms, dtype=np.int64)
+    for a in range(0, total, chunk):
+        t = _term_codes(store, column, tokens[a:a + chunk])
+        counts += np.bincount(t[t != NULL_CODE], minlength=n_terms)
+    ptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+
+    # Pass 2: scatter positions into term order (chunks are in position order,
+    # so each term's positions come out ascending)
+    pos_dtype = np.uint32 if total < 2**32 else np.uint64
+    scratch = out_dir / f"{column}.positions.tmp.npy"
+    positions = np.lib.format.open_memmap(scratch, mode="w+", dtype=pos_dtype, shape=(int(ptr[-1]),))
+    cursor = ptr[:-1].copy()
+    for a in range(0, total, chunk):
+        t = _term_codes(store, column, tokens[a:a + chunk])
+        keep = np.flatnonzero(t != NULL_CODE)
+        t = t[keep]
+        order = np.argsort(t, kind="stable")
+        t_sorted = t[order]
+        starts = np.flatnonzero(np.r_[True, t_sorted[1:] != t_sorted[:-1]])
+        run_len = np.diff(np.r_[starts, len(t_sorted)])
+        within = np.arange(len(t_sorted)) - np.repeat(starts, run_len)
+        positions[cursor[t_sorted] + within] = (keep[order] + a).astype(pos_dtype)
+        cursor[t_sorted[starts]] += run_len
+
+    # Delta + varint encode, a block of whole terms at a time
+    byte_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+    with open(out_dir / f"{column}.postings", "wb") as f:
+        written, lo = 0, 0
+        while lo < n_terms:
+            hi = int(np.searchsorted(ptr, ptr[lo] + chunk, side="right")) - 1
+            hi = min(max(hi, lo + 1), n_terms)
+            block = np.asarray(positions[ptr[lo]:ptr[hi]], dtype=np.uint64)
+            term_of = np.repeat(np.arange(lo, hi), counts[lo:hi])
+            deltas = block.copy()
+            deltas[1:] -= block[:-1]
+            firsts = ptr[lo:hi][counts[lo:hi] > 0] - ptr[lo]
+            deltas[firsts] = block[firsts]
+            enc, nbytes = varint_encode(deltas)
+            f.write(enc.tobytes())
+            per_term = np.bincount(term_of - lo, weights=nbytes, minlength=hi - lo).astype(np.int64)
+            byte_ptr[lo + 1:hi + 1] = written + np.cumsum(per_term)
+            written += len(enc)
+            lo = hi
+    np.save(out_dir / f"{column}.ptr.npy", byte_ptr)
+    np.save(out_dir / f"{column}.df.npy", counts)
+    del positions
+    scratch.unlink()
+    return int(ptr[-1]), written
+
+def build_index(store_dir=STORE_DIR, out_dir=None):
+    store_dir = Path(store_dir)
+    out_dir = Path(out_dir) if out_dir else store_dir.parent / "COHA_index"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    store = open_store(store_dir)
+    for column in COLUMNS:
+        if column not in store["lexicon"]:
+            continue
+        t0 = time.perf_counter()
+        n, size = build_column(store, column, out_dir)
+        print(f"Indexed {column}: {n} postings, {size/1e6:.1f} MB "
+              f"({size/max(n, 1):.2f} bytes/posting) in {time.perf_counter() - t0:.1f}s")
+    return out_dir
+
+# ---- queries ----
+def open_index(index_dir=INDEX_DIR, store_dir=STORE_DIR):
+    index_dir = Path(index_dir)
+    store = open_store(store_dir)
+    index = {"store": store, "columns": {}}
+    for column in COLUMNS:
+        p = index_dir / f"{column}.postings"
+        if not p.exists():
+            continue
+        dictionary = store["lexicon"][column][1]
+        index["columns"][column] = {
+            "postings": np.memmap(p, dtype=np.uint8, mode="r") if p.stat().st_size else np.zeros(0, np.uint8),
+            "ptr": np.load(index_dir / f"{column}.ptr.npy", mmap_mode="r"),
+            "df": np.load(index_dir / f"{column}.df.npy", mmap_mode="r"),
+            "lookup": {term: code for code, term in enumerate(dictionary)},
+        }
+    return index
+
+def postings(index, column, term):
+    # Global token positions of `term`, ascending
+    col = index["columns"][column]
+    code = col["lookup"].get(term)
+    if code is None:
+        return np.zeros(0, dtype=np.uint64)
+    return np.cumsum(varint_decode(col["postings"][col["ptr"][code]:col["ptr"][code + 1]]), dtype=np.uint64)
+
+def _filter_hits(store, pos, years, genres):
+    offsets = store["offsets"]
+    text_ids = np.searchsorted(offsets, pos, side="right") - 1
+    keep = np.ones(len(pos), dtype=bool)
+    if years is not None and "year" in store["meta"]:
+        # texts missing from the sources table have a null year and never match
+        year = text_column(store, "year")[text_ids]
+        keep &= (year >= years[0]) & (year <= years[1])
+    if genres is not None and "genre" in store["meta"]:
+        dictionary = store["meta"]["genre"][1]
+        wanted = [i for i, g in enumerate(dictionary) if g in set(genres)]
+        keep &= np.isin(text_column(store, "genre")[text_ids], wanted)
+    return pos[keep], text_ids[keep]
+
+def kwic(index, lemma=None, word=None, width=5, years=None, genres=None, limit=None):
+    """
+    Yield KWIC lines for a lemma or a surface word, lazily and in corpus order.
+    `years` is an inclusive (start, end) pair; `genres` an iterable of genre labels.
+    """
+    column, term = ("lemma", lemma) if lemma is not None else ("word", word)
+    store = index["store"]
+    pos, text_ids = _filter_hits(store, postings(index, column, term), years, genres)
+    if limit is not None:
+        pos, text_ids = pos[:limit], text_ids[:limit]
+    offsets, tokens = store["offsets"], store["tokens"]
+    for p, t in zip(pos.tolist(), text_ids.tolist()):
+        a, b = int(offsets[t]), int(offsets[t + 1])
+        left = decode(store, tokens[max(a, p - width):p])
+        right = decode(store, tokens[p + 1:min(b, p + width + 1)])
+        yield {
+            "textID": t,
+            "position": p - a,
+            "left": " ".join(w or "?" for w in left),
+            "keyword": decode(store, tokens[p:p + 1])[0],
+            "right": " ".join(w or "?" for w in right),
+        }
+
+
+if __name__ == "__main__":
+    store_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else STORE_DIR
+    out = build_index(store_dir)
+    index = open_index(out, store_dir)
+    t0 = time.perf_counter()
+    lines = list(kwic(index, lemma="democracy", limit=20))
+    print(f"{len(lines)} KWIC lines in {(time.perf_counter() - t0)*1000:.1f} ms")
+    for line in lines:
+        print(f"{line['textID']:>8} {line['left']:>60}  [{line['keyword']}]  {line['right']}")
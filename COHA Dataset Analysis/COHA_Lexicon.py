@@ -0,0 +1,60 @@
+# COHA_Lexicon.py
+# Dense array lookups keyed by COHA's integer ids.
+# wordIDs and textIDs are dense integers, so instead of hash-joining hundreds of
+# millions of token rows against the lexicon or the texts metadata we lay the
+# small side out as contiguous columns indexed by the id and resolve each token
+# batch with a vectorized gather on the id column. String columns are stored as
+# Categorical so tokens carry dictionary codes rather than materialized Utf8.
+import polars as pl
+
+# Give up on the dense layout (and fall back to a hash join) if the id range
+# is more than this many times larger than the number of entries.
+MAX_SPARSITY = 4.0
+
+def build_dense_table(lf, key, cols, max_sparsity=MAX_SPARSITY):
+    """
+    Return {"key": key, "size": n, "columns": {name: Series of length n}} where
+    row i holds the entry for id i (null for unused ids), or None when there
+    are no usable ids or the id range is too sparse for an array layout.
+    """
+    names = lf.collect_schema().names()
+    cols = [c for c in cols if c in names]
+    if key not in names or not cols:
+        return None
+    df = (
+        lf
+        .select([key, *cols])
+        .filter(pl.col(key).is_not_null() & (pl.col(key) >= 0))
+        .unique(key, keep="first", maintain_order=True)
+        .collect()
+    )
+    if df.height == 0:
+        return None
+    size = int(df[key].max()) + 1
+    if size > max_sparsity * df.height:
+        return None
+    dense = (
+        pl.DataFrame({key: pl.arange(0, size, eager=True, dtype=df[key].dtype)})
+        .join(df, on=key, how="left")
+        .sort(key)
+    )
+    columns = {}
+    for c in cols:
+        s = dense[c]
+        columns[c] = s.cast(pl.Categorical) if s.dtype == pl.Utf8 else s
+    return {"key": key, "size": size, "columns": columns}
+
+def build_dense_lexicon(lf_words, max_sparsity=MAX_SPARSITY):
+    return build_dense_table(lf_words, "wordID", ("word","lemma","pos"), max_sparsity)
+
+def build_dense_texts(lf_texts, max_sparsity=MAX_SPARSITY):
+    # The texts table is tiny next to the tokens, so it is broadcast to every batch
+    return build_dense_table(lf_texts, "textID", ("year","decade","genre"), max_sparsity)
+
+def dense_lookup(lf, table):
+    # Out-of-range ids become a null index, which gathers a null like a left join would
+    key, size = table["key"], table["size"]
+    idx = pl.when(pl.col(key).is_between(0, size - 1)).then(pl.col(key))
+    return lf.with_columns(
+        [pl.lit(s).gather(idx).alias(name) for name, s in table["columns"].items()]
+    )
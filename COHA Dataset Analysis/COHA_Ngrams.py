@@ -0,0 +1,129 @@
+# COHA_Ngrams.py
+# Out-of-core bigram/trigram counts by year and decade.
+#
+# N-grams are read off the compact corpus store (COHA_Store.py), where every
+# text's tokens are already contiguous and in occID order, so an n-gram never
+# crosses a text boundary. Counting spills to disk:
+#
+#   1. the store is walked in text-aligned chunks; each chunk's n-grams are
+#      counted by (year, w1..wn) and hash-partitioned into PARTS staging files
+#   2. each partition's staged counts are merged on their own, then rolled up
+#      from year to decade (partitions are by n-gram, so both roll-ups are exact)
+#
+# Chunk size and partition count both derive from the memory budget, so the
+# trigram vocabulary never has to fit in RAM at once.
+from pathlib import Path
+import argparse
+import math
+import shutil
+import time
+import numpy as np
+import polars as pl
+
+from COHA_Store import BASE, STORE_DIR, NULL_CODE, NULL_INT, open_store, text_chunks, text_column
+
+NGRAMS_DIR = BASE / "COHA_ngrams"
+MEMORY_BUDGET_GB = 8
+ROW_BYTES = 64  # rough in-memory cost of one (year, w1..w3, n) row during a group_by
+
+def _unit_ids(store, tokens, unit):
+    if unit == "word":
+        return np.asarray(tokens, dtype=np.uint32)
+    codes, _ = store["lexicon"][unit]
+    out = np.full(len(tokens), NULL_CODE, dtype=np.uint32)
+    ok = tokens < len(codes)
+    out[ok] = codes[tokens[ok]]
+    return out
+
+def chunk_ngrams(store, t0, t1, n, unit):
+    offsets = store["offsets"]
+    a, b = int(offsets[t0]), int(offsets[t1])
+    ids = _unit_ids(store, store["tokens"][a:b], unit)
+    lengths = np.diff(offsets[t0:t1 + 1])
+    text_of = np.repeat(np.arange(t0, t1), lengths)
+    m = len(ids) - n + 1
+    if m <= 0:
+        return None
+    cols = [ids[k:k + m] for k in range(n)]
+    keep = text_of[:m] == text_of[n - 1:n - 1 + m]
+    for c in cols:
+        keep &= c != NULL_CODE
+    year_arr = text_column(store, "year") if "year" in store["meta"] else None
+    year = year_arr[text_of[:m][keep]] if year_arr is not None else np.full(int(keep.sum()), NULL_INT)
+    return pl.DataFrame(
+        {"year": year.astype(np.int32), **{f"w{k+1}": c[keep] for k, c in enumerate(cols)}}
+    ).with_columns(pl.when(pl.col("year") == NULL_INT).then(None).otherwise(pl.col("year")).alias("year"))
+
+def count_ngrams(n, unit="word", store_dir=STORE_DIR, out_dir=None, budget_gb=MEMORY_BUDGET_GB):
+    store = open_store(store_dir)
+    out_dir = Path(out_dir) if out_dir else Path(store_dir).parent / "COHA_ngrams"
+    stage = out_dir / f"stage_{unit}_{n}"
+    if stage.exists():
+        shutil.rmtree(stage)
+    budget = budget_gb * 1e9
+    total = len(store["tokens"])
+    chunk_tokens = max(100_000, int(budget / (ROW_BYTES * 4)))
+    parts = max(1, math.ceil(total * ROW_BYTES / budget))
+    keys = [f"w{k+1}" for k in range(n)]
+    t_start = time.perf_counter()
+
+    # 1. count each chunk and spill it by n-gram hash
+    for i, (t0, t1) in enumerate(text_chunks(store["offsets"], chunk_tokens)):
+        df = chunk_ngrams(store, t0, t1, n, unit)
+        if df is None or df.height == 0:
+            continue
+        counted = (
+            df.group_by(["year", *keys]).agg(pl.len().cast(pl.UInt64).alias("n"))
+            .with_columns((pl.struct(keys).hash() % parts).alias("part"))
+        )
+        for (p,), piece in counted.partition_by("part", as_dict=True).items():
+            d = stage / f"p{p:04d}"
+            d.mkdir(parents=True, exist_ok=True)
+            piece.drop("part").write_parquet(d / f"c{i:05d}.parquet")
+
+    # 2. merge each partition, then roll years up to decades
+    by_year = out_dir / f"{unit}_{n}gram_by_year"
+    by_decade = out_dir / f"{unit}_{n}gram_by_decade"
+    for d in (by_year, by_decade):
+        if d.exists():
+            shutil.rmtree(d)
+        d.mkdir(parents=True)
+    for d in sorted(stage.glob("p*")) if stage.exists() else []:
+        merged = pl.read_parquet(d / "*.parquet").group_by(["year", *keys]).agg(pl.col("n").sum())
+        merged.write_parquet(by_year / f"{d.name}.parquet")
+        (
+            merged.with_columns((pl.col("year") // 10 * 10).alias("decade"))
+            .group_by(["decade", *keys]).agg(pl.col("n").sum())
+            .write_parquet(by_decade / f"{d.name}.parquet")
+        )
+    if stage.exists():
+        shutil.rmtree(stage)
+    print(f"{unit} {n}-grams: {parts} partitions, chunks of ~{chunk_tokens} tokens, "
+          f"{time.perf_counter() - t_start:.1f}s -> {by_year}, {by_decade}")
+    return by_year, by_decade
+
+def decode_ngrams(df, store, unit="word"):
+    # Attach the strings for w1..wn (word for wordIDs, else the unit's dictionary)
+    if unit == "word":
+        codes, dictionary = store["lexicon"]["word"]
+        lookup = lambda ids: [dictionary[codes[i]] if i < len(codes) and codes[i] != NULL_CODE else None for i in ids]
+    else:
+        dictionary = store["lexicon"][unit][1]
+        lookup = lambda ids: [dictionary[i] for i in ids]
+    keys = [c for c in df.columns if c.startswith("w") and c[1:].isdigit()]
+    return df.with_columns(
+        pl.concat_str([pl.Series(k, lookup(df[k].to_list())) for k in keys], separator=" ").alias("ngram")
+    )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Bigram/trigram counts by year and decade from the COHA store")
+    ap.add_argument("--n", type=int, nargs="+", default=[2, 3])
+    ap.add_argument("--unit", choices=["word","lemma","pos"], default="word")
+    ap.add_argument("--store", default=str(STORE_DIR))
+    ap.add_argument("--budget-gb", type=float, default=MEMORY_BUDGET_GB)
+    args = ap.parse_args()
+    for n in args.n:
+        by_year, by_decade = count_ngrams(n, args.unit, args.store, budget_gb=args.budget_gb)
+        top = pl.scan_parquet(str(by_decade / "*.parquet")).sort("n", descending=True).head(10).collect()
+        print(decode_ngrams(top, open_store(args.store), args.unit))
@@ -0,0 +1,226 @@
+# COHA_Patterns.py
+# Token-sequence pattern queries over the compact corpus store (COHA_Store.py).
+#
+#   python COHA_Patterns.py "pos=ADJ democracy"
+#   python COHA_Patterns.py "pos=MODAL {0,2} pos=VERB" --by decade
+#   python COHA_Patterns.py "word=the lemma=people|nation" --kwic 20
+#
+# A pattern is a sequence of token elements, optionally separated by gaps:
+#
+#   democracy               bare term: lemma=democracy
+#   lemma=run|walk          word= / lemma= / pos= with |-separated globs (* ?)
+#   pos!=nn*                negated constraint
+#   lemma=run&pos=vv*       several constraints on one token
+#   _                       any token
+#   {1,3}  {2}              1 to 3 (exactly 2) arbitrary tokens in between
+#
+# pos also accepts the coarse tags in POS_ALIASES (ADJ, NOUN, VERB, MODAL ...),
+# expanded to CLAWS globs. Every word/lemma/pos in the store is a function of
+# the wordID, so each element compiles to one boolean table over wordIDs, and
+# matching is table[tokens] followed by shifted-array comparisons (kept inside
+# one text). Matches are counted once per start position. Text-aligned chunks
+# of the store are matched in parallel worker processes.
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from pathlib import Path
+import argparse
+import os
+import re
+import time
+import numpy as np
+import polars as pl
+
+from COHA_Store import BASE, STORE_DIR, NULL_CODE, NULL_INT, open_store, text_chunks, text_column, text_decades, decode
+
+CHUNK_TOKENS = 20_000_000
+MAX_GAP = 10
+POS_ALIASES = {
+    "ADJ": "jj*",
+    "ADV": "r*",
+    "NOUN": "nn*",
+    "PROPN": "np*",
+    "VERB": "vv*",
+    "MODAL": "vm*",
+    "DET": "at*|d*",
+    "PRON": "p*",
+    "ADP": "i*",
+    "CONJ": "c*",
+    "NUM": "m*",
+}
+_CONSTRAINT = re.compile(r"^(word|lemma|pos)(!?=)(.+)$")
+_GAP = re.compile(r"^\{(\d+)(?:,(\d+))?\}$")
+
+# ---- compiling ----
+def parse(pattern):
+    """
+    Split a pattern into elements: [(constraints, (min_gap, max_gap)), ...] where
+    constraints are (column, negated, [globs]) and the gap is the one before it.
+    """
+    elements, gap = [], (0, 0)
+    for part in pattern.split():
+        m = _GAP.match(part)
+        if m:
+            lo = int(m.group(1))
+            hi = int(m.group(2)) if m.group(2) is not None else lo
+            if not elements or gap != (0, 0) or hi < lo or hi > MAX_GAP:
+                raise ValueError(f"bad gap {part!r} in {pattern!r}")
+            gap = (lo, hi)
+            continue
+        constraints = []
+        if part != "_":
+            for piece in part.split("&"):
+                c = _CONSTRAINT.match(piece)
+                column, op, value = c.groups() if c else ("lemma", "=", piece)
+                globs = []
+                for v in value.split("|"):
+                    globs += POS_ALIASES.get(v, v).split("|") if column == "pos" else [v]
+                constraints.append((column, op == "!=", globs))
+        elements.append((constraints, gap))
+        gap = (0, 0)
+    if not elements or gap != (0, 0):
+        raise ValueError(f"pattern {pattern!r} must start and end with a token")
+    return elements
+
+def compile_pattern(store, pattern):
+    # One boolean table over wordIDs per element
+    lexicon = store["lexicon"]
+    n_words = len(next(iter(lexicon.values()))[0]) if lexicon else 0
+    tables = []
+    for constraints, gap in parse(pattern):
+        ok = np.ones(n_words, dtype=bool)
+        for column, negated, globs in constraints:
+            if column not in lexicon:
+                raise ValueError(f"the store has no {column} column")
+            codes, dictionary = lexicon[column]
+            wanted = [i for i, term in enumerate(dictionary) if any(fnmatchcase(term, g) for g in globs)]
+            hit = np.isin(codes, np.asarray(wanted, dtype=codes.dtype))
+            ok &= ~hit if negated else hit
+        tables.append((ok, gap))
+    return tables
+
+# ---- matching ----
+def match_chunk(store, tables, t0, t1):
+    """
+    Match starts inside texts [t0, t1). Returns (start positions, span lengths)
+    in global token positions; the span is the shortest match from that start.
+    """
+    offsets = store["offsets"]
+    a, b = int(offsets[t0]), int(offsets[t1])
+    tokens = np.asarray(store["tokens"][a:b])
+    n = len(tokens)
+    text_of = np.repeat(np.arange(t0, t1), np.diff(offsets[t0:t1 + 1]))
+
+    def element_hits(table):
+        hit = np.zeros(n, dtype=bool)
+        ok = tokens < len(table)
+        hit[ok] = table[tokens[ok]]
+        return hit
+
+    # states: offset of the last matched element from the start -> starts that reach it
+    first, _ = tables[0]
+    states = {0: element_hits(first)}
+    for table, (lo, hi) in tables[1:]:
+        hits = element_hits(table)
+        new = {}
+        for d, starts in states.items():
+            for g in range(lo, hi + 1):
+                d2 = d + g + 1
+                if d2 >= n:
+                    continue
+                reach = np.zeros(n, dtype=bool)
+                reach[:n - d2] = starts[:n - d2] & hits[d2:] & (text_of[:n - d2] == text_of[d2:])
+                new[d2] = new[d2] | reach if d2 in new else reach
+        states = new
+        if not states:
+            break
+    span = np.full(n, -1, dtype=np.int64)
+    for d in sorted(states, reverse=True):
+        span[states[d]] = d + 1
+    starts = np.flatnonzero(span > 0)
+    return starts + a, span[starts]
+
+_worker = {}
+
+def _init_worker(store_dir, tables):
+    _worker["store"] = open_store(store_dir)
+    _worker["tables"] = tables
+
+def _match_range(bounds):
+    return match_chunk(_worker["store"], _worker["tables"], *bounds)
+
+def find(pattern, store_dir=STORE_DIR, workers=None, chunk_tokens=CHUNK_TOKENS):
+    """
+    Every match of `pattern`: (start positions, span lengths), in corpus order.
+    """
+    store = open_store(store_dir)
+    tables = compile_pattern(store, pattern)
+    workers = workers or os.cpu_count() or 1
+    total = len(store["tokens"])
+    chunk_tokens = max(100_000, min(chunk_tokens, total // (workers * 4) + 1))
+    ranges = list(text_chunks(store["offsets"], chunk_tokens))
+    if workers == 1 or len(ranges) == 1:
+        parts = [match_chunk(store, tables, *r) for r in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(store_dir), tables)) as pool:
+            parts = list(pool.map(_match_range, ranges))
+    if not parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+def counts_by(store, starts, by="year"):
+    text_ids = np.searchsorted(store["offsets"], starts, side="right") - 1
+    needs = ("decade", "year") if by == "decade" else (by,)
+    if not any(c in store["meta"] for c in needs):
+        raise ValueError(f"the store has no {by} column in its texts metadata")
+    if by == "decade":
+        keys, dictionary = text_decades(store)[text_ids], None
+    else:
+        dictionary = store["meta"][by][1]
+        keys = np.asarray(text_column(store, by))[text_ids]
+    keys = keys[keys != (NULL_CODE if dictionary is not None else NULL_INT)]
+    df = pl.DataFrame({by: keys}).group_by(by).agg(pl.len().alias("n"))
+    if dictionary is not None:
+        # genre and other string columns come back as labels, not codes
+        df = df.with_columns(pl.Series(by, dictionary, dtype=pl.Utf8).gather(df[by]))
+    return df.sort(by)
+
+def pattern_kwic(store, starts, spans, width=5, limit=None):
+    # KWIC lines for matches, in the same shape as COHA_Index.kwic
+    offsets, tokens = store["offsets"], store["tokens"]
+    text_ids = np.searchsorted(offsets, starts, side="right") - 1
+    for p, s, t in list(zip(starts.tolist(), spans.tolist(), text_ids.tolist()))[:limit]:
+        a, b = int(offsets[t]), int(offsets[t + 1])
+        yield {
+            "textID": t,
+            "position": p - a,
+            "left": " ".join(w or "?" for w in decode(store, tokens[max(a, p - width):p])),
+            "keyword": " ".join(w or "?" for w in decode(store, tokens[p:p + s])),
+            "right": " ".join(w or "?" for w in decode(store, tokens[p + s:min(b, p + s + width)])),
+        }
+
+def pattern_counts(pattern, by="year", store_dir=STORE_DIR, workers=None, kwic=0):
+    """
+    Match counts of `pattern` per year (or decade/genre), and up to `kwic` KWIC lines.
+    """
+    starts, spans = find(pattern, store_dir, workers)
+    store = open_store(store_dir)
+    lines = list(pattern_kwic(store, starts, spans, limit=kwic)) if kwic else []
+    return counts_by(store, starts, by), lines
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Token-pattern match counts over the COHA store")
+    ap.add_argument("pattern")
+    ap.add_argument("--by", choices=["year","decade","genre"], default="year")
+    ap.add_argument("--kwic", type=int, default=0, metavar="N", help="also print the first N matches")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--store", default=str(STORE_DIR))
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    counts, lines = pattern_counts(args.pattern, args.by, args.store, args.workers, args.kwic)
+    print(f"{counts['n'].sum()} matches in {time.perf_counter() - t0:.2f}s")
+    with pl.Config(tbl_rows=30):
+        print(counts)
+    for line in lines:
+        print(f"{line['textID']:>8} {line['left']:>50}  [{line['keyword']}]  {line['right']}")
@@ -0,0 +1,238 @@
+# COHA_Sketches.py
+# Approximate mode: small mergeable sketches instead of exact group-bys.
+#
+# Every token shard is read once and summarized into four sketches, stored per
+# shard next to a manifest (same incremental refresh as the cube partials in
+# COHA_Cube.py), so adding or changing a shard only re-sketches that shard and
+# the corpus-wide answer is a cheap merge:
+#
+#   hll  HyperLogLog, p = HLL_P, per (year, word|lemma): distinct terms per year.
+#        Registers merge by max. Standard error 1.04 / sqrt(2^p) (~0.81% at p=14).
+#   cms  Count-Min, CMS_DEPTH x CMS_WIDTH, per decade over lemmas. Counters merge
+#        by sum. An estimate never undercounts and overcounts by at most
+#        e / width * N (N = tokens in the decade) with probability 1 - e^-depth
+#        (~0.004% of N with probability ~98% at 4 x 65536).
+#   mg   Misra-Gries heavy hitters, MG_COUNTERS per decade over lemmas. Merged by
+#        summing counters and subtracting the (k+1)-th largest. Counts undercount
+#        by at most N / (k + 1), and every lemma above that frequency is present.
+#   len  DDSketch-style log buckets of tokens per text, per decade. Buckets merge
+#        by sum; every quantile is within LEN_ALPHA (1%) relative error. A text
+#        split across shards counts as one partial document per shard.
+#
+# Top terms per decade take their candidates from mg and their counts from cms.
+# Hashes come from polars' Expr.hash, which is only stable within one polars
+# version, so the version is part of the manifest fingerprint.
+from pathlib import Path
+import argparse
+import math
+import time
+import polars as pl
+
+from COHA_Catalog import build_tokens_lazy
+from COHA_Cube import refresh_shard_outputs, shard_files
+from COHA_Stream import BASE, apply_lookups
+
+SKETCH_DIR = BASE / "COHA_sketches"
+SKETCHES = ("hll","cms","mg","len")
+HLL_P = 14
+HLL_SEED = 0x5EED
+CMS_DEPTH = 4
+CMS_WIDTH = 1 << 16
+MG_COUNTERS = 2000
+LEN_ALPHA = 0.01
+LEN_GAMMA = (1 + LEN_ALPHA) / (1 - LEN_ALPHA)
+SALT = f"polars {pl.__version__}|hll {HLL_P}|cms {CMS_DEPTH}x{CMS_WIDTH}|mg {MG_COUNTERS}|len {LEN_ALPHA}"
+
+def _hash(col, seed):
+    # Hash the string itself; Categorical codes differ from shard to shard
+    return pl.col(col).cast(pl.Utf8).hash(seed=seed)
+
+# ---- per-shard sketches ----
+def hll_registers(df, unit):
+    tail = 64 - HLL_P
+    h = _hash(unit, HLL_SEED)
+    return (
+        df.filter(pl.col(unit).is_not_null())
+        .select(
+            "year",
+            pl.lit(unit).alias("unit"),
+            (h // (1 << tail)).cast(pl.UInt16).alias("idx"),
+            # leading zeros of the low `tail` bits, + 1
+            ((h % (1 << tail)).bitwise_leading_zeros().cast(pl.Int16) - HLL_P + 1).cast(pl.UInt8).alias("rank"),
+        )
+        .group_by(["year","unit","idx"]).agg(pl.col("rank").max())
+    )
+
+def cms_counters(counts):
+    # counts: (decade, lemma, n) -> (decade, row, col, n)
+    return pl.concat([
+        counts.select(
+            "decade",
+            pl.lit(r, dtype=pl.UInt8).alias("row"),
+            (_hash("lemma", r + 1) % CMS_WIDTH).cast(pl.UInt32).alias("col"),
+            "n",
+        )
+        for r in range(CMS_DEPTH)
+    ]).group_by(["decade","row","col"]).agg(pl.col("n").sum())
+
+def mg_reduce(counts, k=MG_COUNTERS):
+    # Keep the k largest counters per decade, less the (k+1)-th largest
+    thr = (
+        pl.when(pl.len().over("decade") > k)
+        .then(pl.col("n").top_k(k + 1).min().over("decade"))
+        .otherwise(0)
+    )
+    return (
+        counts.with_columns(
+            (pl.col("n") - thr).alias("n"),
+            pl.col("n").rank("ordinal", descending=True).over("decade").alias("_rank"),
+        )
+        .filter((pl.col("_rank") <= k) & (pl.col("n") > 0))
+        .drop("_rank")
+    )
+
+def len_buckets(df):
+    return (
+        df.filter(pl.col("textID").is_not_null())
+        .group_by(["textID","decade"]).agg(pl.len().alias("tokens"))
+        .select(
+            "decade",
+            (pl.col("tokens").cast(pl.Float64).log() / math.log(LEN_GAMMA)).ceil().cast(pl.Int32).alias("bucket"),
+        )
+        .group_by(["decade","bucket"]).agg(pl.len().cast(pl.Int64).alias("n"))
+    )
+
+def shard_sketches(entry, lookups):
+    lf = apply_lookups(build_tokens_lazy([entry]), lookups)
+    names = lf.collect_schema().names()
+    df = lf.select([c for c in ("textID","word","lemma","year","decade") if c in names]).collect()
+    for c, dtype in (("year", pl.Int32), ("decade", pl.Int32), ("lemma", pl.Utf8), ("word", pl.Utf8)):
+        if c not in df.columns:
+            df = df.with_columns(pl.lit(None, dtype=dtype).alias(c))
+    counts = (
+        df.filter(pl.col("lemma").is_not_null())
+        .group_by(["decade", pl.col("lemma").cast(pl.Utf8)]).agg(pl.len().cast(pl.Int64).alias("n"))
+    )
+    return {
+        "hll": pl.concat([hll_registers(df, u) for u in ("word","lemma")]),
+        "cms": cms_counters(counts),
+        "mg": mg_reduce(counts),
+        "len": len_buckets(df),
+    }
+
+def refresh_sketches(base=BASE, sketch_dir=None):
+    sketch_dir = Path(sketch_dir) if sketch_dir else Path(base) / "COHA_sketches"
+    return refresh_shard_outputs(base, sketch_dir, shard_sketches, SKETCHES, label="Sketches", salt=SALT)
+
+# ---- merging ----
+def merge_sketches(manifest, sketch_dir):
+    def scan(name):
+        return pl.concat([pl.scan_parquet(f) for f in shard_files(manifest, sketch_dir, name)])
+    return {
+        "hll": scan("hll").group_by(["year","unit","idx"]).agg(pl.col("rank").max()).collect(),
+        "cms": scan("cms").group_by(["decade","row","col"]).agg(pl.col("n").sum()).collect(),
+        "mg": mg_reduce(scan("mg").group_by(["decade","lemma"]).agg(pl.col("n").sum()).collect()),
+        "len": scan("len").group_by(["decade","bucket"]).agg(pl.col("n").sum()).collect(),
+    }
+
+# ---- estimates ----
+def distinct_per_year(hll):
+    m = 1 << HLL_P
+    alpha = 0.7213 / (1 + 1.079 / m)
+    est = (
+        hll.group_by(["year","unit"])
+        .agg(
+            # registers never set have rank 0 and contribute 2^0 each
+            ((2.0 ** -pl.col("rank").cast(pl.Float64)).sum() + (m - pl.len())).alias("z"),
+            (m - pl.len()).alias("zeros"),
+        )
+        .with_columns((alpha * m * m / pl.col("z")).alias("raw"))
+    )
+    # small-range correction: linear counting while registers are still empty
+    linear = m * (m / pl.col("zeros").cast(pl.Float64)).log()
+    return (
+        est.with_columns(
+            pl.when((pl.col("raw") <= 2.5 * m) & (pl.col("zeros") > 0)).then(linear).otherwise(pl.col("raw"))
+            .round(0).cast(pl.Int64).alias("distinct")
+        )
+        .with_columns((pl.col("distinct") * 1.04 / math.sqrt(m)).round(0).cast(pl.Int64).alias("std_error"))
+        .select(["year","unit","distinct","std_error"])
+        .sort(["unit","year"])
+    )
+
+def cms_estimate(cms, terms):
+    # terms: (decade, lemma) -> + cms (min over rows)
+    probes = pl.concat([
+        terms.select(
+            "decade", "lemma",
+            pl.lit(r, dtype=pl.UInt8).alias("row"),
+            (_hash("lemma", r + 1) % CMS_WIDTH).cast(pl.UInt32).alias("col"),
+        )
+        for r in range(CMS_DEPTH)
+    ])
+    return (
+        probes.join(cms, on=["decade","row","col"], how="left")
+        .group_by(["decade","lemma"]).agg(pl.col("n").fill_null(0).min().alias("cms"))
+    )
+
+def top_terms(sketches, k=50):
+    """
+    Top `k` lemmas per decade: Misra-Gries candidates ranked by their Count-Min
+    estimate, with the per-decade error bound of each count (in tokens).
+    """
+    cms, mg = sketches["cms"], sketches["mg"]
+    totals = cms.filter(pl.col("row") == 0).group_by("decade").agg(pl.col("n").sum().alias("tokens"))
+    return (
+        mg.rename({"n": "mg"})
+        .join(cms_estimate(cms, mg.select(["decade","lemma"])), on=["decade","lemma"], how="left")
+        .join(totals, on="decade", how="left")
+        .with_columns(
+            (pl.col("tokens") * math.e / CMS_WIDTH).ceil().cast(pl.Int64).alias("cms_bound"),
+            (pl.col("tokens") // (MG_COUNTERS + 1)).alias("mg_bound"),
+        )
+        .filter(pl.col("cms").rank("ordinal", descending=True).over("decade") <= k)
+        .sort(["decade","cms"], descending=[False, True])
+    )
+
+def length_quantiles(buckets, qs=(0.5, 0.9, 0.99)):
+    rows = []
+    for (decade,), g in buckets.sort("bucket").group_by(["decade"], maintain_order=True):
+        cum = g["n"].cum_sum().to_list()
+        b = g["bucket"].to_list()
+        for q in qs:
+            rank = q * (cum[-1] - 1)
+            i = next(j for j, c in enumerate(cum) if c > rank)
+            rows.append({"decade": decade, "q": q, "tokens": 2 * LEN_GAMMA ** b[i] / (LEN_GAMMA + 1)})
+    return pl.DataFrame(rows, schema={"decade": pl.Int32, "q": pl.Float64, "tokens": pl.Float64}).sort(["decade","q"])
+
+def approximate_report(base=BASE, out_dir=None, k=50):
+    base = Path(base)
+    out_dir = Path(out_dir) if out_dir else base
+    manifest, sketch_dir = refresh_sketches(base)
+    if manifest.height == 0:
+        print("No token shards found.")
+        return None
+    sketches = merge_sketches(manifest, sketch_dir)
+    report = {
+        "distinct_per_year": distinct_per_year(sketches["hll"]),
+        "top_lemmas_per_decade": top_terms(sketches, k),
+        "doclen_quantiles": length_quantiles(sketches["len"]),
+    }
+    for name, df in report.items():
+        df.write_parquet(out_dir / f"out_approx_{name}.parquet")
+        print("Wrote:", out_dir / f"out_approx_{name}.parquet")
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Approximate COHA statistics from mergeable per-shard sketches")
+    ap.add_argument("base", nargs="?", default=str(BASE))
+    ap.add_argument("--top", type=int, default=50)
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    report = approximate_report(args.base, k=args.top)
+    if report is not None:
+        print(report["distinct_per_year"].head(10))
+        print(report["top_lemmas_per_decade"].group_by("decade", maintain_order=True).head(5))
+        print(report["doclen_quantiles"])
+    print(f"Approximate report in {time.perf_counter() - t0:.2f}s")
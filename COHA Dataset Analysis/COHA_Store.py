@@ -0,0 +1,229 @@
+# COHA_Store.py
+# Memory-mapped compact corpus store: every text's tokens as one contiguous run
+# of uint32 wordIDs (in occID order) inside a single .npy file, located through
+# an offsets array indexed by textID:
+#
+#   tokens[offsets[t]:offsets[t+1]]      -> wordIDs of text t, zero-copy
+#
+# The lexicon (word/lemma/pos) and the texts metadata (year/decade/genre) are
+# stored as id-indexed arrays too; string columns as uint32 dictionary codes
+# plus a JSON dictionary. Everything is opened with np.load(mmap_mode="r").
+#
+# The build streams the token shards twice: once to count tokens per text (which
+# fixes the offsets), once to scatter each shard's wordIDs into place. Texts that
+# are split across shards are re-sorted by occID at the end; only their occIDs
+# are kept, in a scratch memmap. The texts metadata arrays are cut or padded
+# with nulls to one entry per textID of the offsets.
+from pathlib import Path
+import json
+import sys
+import time
+import numpy as np
+import polars as pl
+
+from COHA_Catalog import build_tokens_lazy
+from COHA_Lexicon import build_dense_table
+from COHA_Stream import BASE, load_frames, token_shards, texts_table
+
+STORE_DIR = BASE / "COHA_store"
+NULL_CODE = np.uint32(0xFFFFFFFF)  # null wordID / null dictionary code
+NULL_INT = -1
+OCC_LAST = np.iinfo(np.int64).max  # null occIDs sort after the rest of their text
+
+# ---- writing ----
+def _save_column(out_dir, name, s):
+    # Strings become uint32 codes + dictionary, integers are stored as-is
+    if s.dtype in (pl.Categorical, pl.Utf8):
+        s = s.cast(pl.Categorical)
+        np.save(out_dir / f"{name}.npy", s.to_physical().fill_null(int(NULL_CODE)).to_numpy().astype(np.uint32))
+        (out_dir / f"{name}.dict.json").write_text(json.dumps(s.cat.get_categories().to_list()))
+        return "dict"
+    np.save(out_dir / f"{name}.npy", s.fill_null(NULL_INT).to_numpy())
+    return "int"
+
+def _fit(s, length):
+    # Cut or null-pad a column to exactly `length` rows
+    return s.head(length).extend_constant(None, max(length - len(s), 0))
+
+def _save_table(out_dir, prefix, table, length=None):
+    if table is None:
+        return {}
+    return {
+        c: _save_column(out_dir, f"{prefix}_{c}", s if length is None else _fit(s, length))
+        for c, s in table["columns"].items()
+    }
+
+def _shard_frame(entry):
+    lf = build_tokens_lazy([entry]).filter(pl.col("textID").is_not_null() & (pl.col("textID") >= 0))
+    order = ["textID","occID"] if "occID" in lf.collect_schema().names() else ["textID"]
+    return lf.sort(order, nulls_last=True).collect()
+
+def build_store(base=BASE, out_dir=None):
+    base = Path(base)
+    out_dir = Path(out_dir) if out_dir else base / "COHA_store"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    shards = token_shards(base)
+    _, lf_words, lf_texts = load_frames(base)
+
+    # Pass 1: tokens per textID (and how many shards each text appears in)
+    counts = np.zeros(0, dtype=np.int64)
+    shard_hits = np.zeros(0, dtype=np.int32)
+    for entry in shards:
+        per_text = (
+            build_tokens_lazy([entry])
+            .filter(pl.col("textID").is_not_null() & (pl.col("textID") >= 0))
+            .group_by("textID").agg(pl.len().alias("n"))
+            .collect()
+        )
+        if per_text.height == 0:
+            continue
+        t = per_text["textID"].to_numpy()
+        if t.max() >= len(counts):
+            grow = int(t.max()) + 1 - len(counts)
+            counts = np.concatenate([counts, np.zeros(grow, dtype=np.int64)])
+            shard_hits = np.concatenate([shard_hits, np.zeros(grow, dtype=np.int32)])
+        counts[t] += per_text["n"].to_numpy()
+        shard_hits[t] += 1
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    total = int(offsets[-1])
+    np.save(out_dir / "offsets.npy", offsets)
+
+    # Pass 2: scatter each shard's wordIDs to cursor[textID] + rank within the text
+    tokens = np.lib.format.open_memmap(out_dir / "tokens.npy", mode="w+", dtype=np.uint32, shape=(total,))
+    split = np.flatnonzero(shard_hits > 1)
+    occ = None
+    if len(split):
+        # occIDs of split texts only, packed text after text: occ[occ_start[t] + rank]
+        occ_start = np.full(len(counts), -1, dtype=np.int64)
+        occ_start[split] = np.r_[0, np.cumsum(counts[split])[:-1]]
+        occ = np.lib.format.open_memmap(out_dir / "occ.scratch.npy", mode="w+", dtype=np.int64,
+                                        shape=(int(counts[split].sum()),))
+    cursor = offsets[:-1].copy()
+    for entry in shards:
+        df = _shard_frame(entry)
+        if df.height == 0:
+            continue
+        t = df["textID"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, t[1:] != t[:-1]])
+        run_len = np.diff(np.r_[starts, len(t)])
+        within = np.arange(len(t)) - np.repeat(starts, run_len)
+        dest = cursor[t] + within
+        tokens[dest] = df["wordID"].fill_null(int(NULL_CODE)).to_numpy().astype(np.uint32)
+        if occ is not None and "occID" in df.columns:
+            hit = occ_start[t] >= 0
+            occ[occ_start[t[hit]] + (dest[hit] - offsets[t[hit]])] = df["occID"].fill_null(OCC_LAST).to_numpy()[hit]
+        cursor[t[starts]] += run_len
+    # Texts split across shards were filled shard by shard; restore occID order
+    if occ is not None:
+        for tid in split:
+            a, b = offsets[tid], offsets[tid + 1]
+            o = occ_start[tid]
+            tokens[a:b] = tokens[a:b][np.argsort(occ[o:o + b - a], kind="stable")]
+        del occ
+        (out_dir / "occ.scratch.npy").unlink()
+    tokens.flush()
+    del tokens
+
+    # Lexicon and texts metadata as id-indexed arrays (no sparsity limit here)
+    lexicon = build_dense_table(lf_words, "wordID", ("word","lemma","pos"), float("inf")) if lf_words is not None else None
+    texts = None
+    if lf_texts is not None:
+        texts = build_dense_table(texts_table(lf_texts), "textID", ("year","decade","genre"), float("inf"))
+    meta = {
+        "tokens": total,
+        "texts": int((counts > 0).sum()),
+        "lexicon": _save_table(out_dir, "lex", lexicon),
+        # one entry per textID of the offsets, whatever range the sources table covers
+        "meta": _save_table(out_dir, "text", texts, len(offsets) - 1),
+    }
+    (out_dir / "store.json").write_text(json.dumps(meta, indent=2))
+
+    size = sum(p.stat().st_size for p in out_dir.iterdir())
+    src = sum(e["size"] for e in shards)
+    print(f"Wrote {total} tokens / {meta['texts']} texts to {out_dir} in {time.perf_counter() - t0:.1f}s")
+    print(f"Store size {size/1e6:.1f} MB vs token shards {src/1e6:.1f} MB")
+    return out_dir
+
+# ---- reading ----
+def open_store(store_dir=STORE_DIR):
+    store_dir = Path(store_dir)
+    meta = json.loads((store_dir / "store.json").read_text())
+    store = {
+        "tokens": np.load(store_dir / "tokens.npy", mmap_mode="r"),
+        "offsets": np.load(store_dir / "offsets.npy", mmap_mode="r"),
+        "lexicon": {},
+        "meta": {},
+    }
+    for group, prefix in (("lexicon","lex"), ("meta","text")):
+        for col, kind in meta[group].items():
+            arr = np.load(store_dir / f"{prefix}_{col}.npy", mmap_mode="r")
+            dictionary = None
+            if kind == "dict":
+                dictionary = json.loads((store_dir / f"{prefix}_{col}.dict.json").read_text())
+            store[group][col] = (arr, dictionary)
+    return store
+
+def doc(store, text_id):
+    # Zero-copy view of a text's wordIDs; empty for unknown textIDs
+    offsets = store["offsets"]
+    if not 0 <= text_id < len(offsets) - 1:
+        return store["tokens"][0:0]
+    return store["tokens"][offsets[text_id]:offsets[text_id + 1]]
+
+def text_chunks(offsets, chunk_tokens):
+    # Ranges [t0, t1) of whole texts holding at most ~chunk_tokens tokens each
+    t, n_texts = 0, len(offsets) - 1
+    while t < n_texts:
+        end = int(np.searchsorted(offsets, offsets[t] + chunk_tokens, side="right")) - 1
+        end = min(max(end, t + 1), n_texts)
+        yield t, end
+        t = end
+
+def text_column(store, column):
+    # A texts metadata array with exactly one entry per textID of the offsets
+    # (stores built before the arrays were padded can be shorter)
+    arr, dictionary = store["meta"][column]
+    n = len(store["offsets"]) - 1
+    if len(arr) >= n:
+        return arr[:n]
+    out = np.full(n, NULL_CODE if dictionary is not None else NULL_INT, dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
+
+def text_decades(store):
+    # Decade of every textID (NULL_INT where unknown)
+    if "decade" in store["meta"]:
+        return np.asarray(text_column(store, "decade"))
+    year = np.asarray(text_column(store, "year"))
+    return np.where(year == NULL_INT, NULL_INT, year // 10 * 10)
+
+def decode(store, word_ids, column="word"):
+    codes, dictionary = store["lexicon"][column]
+    ids = np.asarray(word_ids)
+    ok = ids < len(codes)
+    out = np.full(len(ids), NULL_CODE, dtype=np.uint32)
+    out[ok] = codes[ids[ok]]
+    return [dictionary[c] if c != NULL_CODE else None for c in out]
+
+def text_meta(store, text_id, column):
+    arr, dictionary = store["meta"][column]
+    if not 0 <= text_id < len(arr):
+        return None
+    v = arr[text_id]
+    if dictionary is not None:
+        return dictionary[v] if v != NULL_CODE else None
+    return int(v) if v != NULL_INT else None
+
+
+if __name__ == "__main__":
+    base = Path(sys.argv[1]) if len(sys.argv) > 1 else BASE
+    out = build_store(base)
+    store = open_store(out)
+    non_empty = np.flatnonzero(np.diff(store["offsets"]))
+    if len(non_empty):
+        first = int(non_empty[0])
+        print(f"text {first}:", " ".join(w or "?" for w in decode(store, doc(store, first)[:30])))
+    else:
+        print("The store is empty: no text has any tokens")
@@ -0,0 +1,81 @@
+# COHA_Stream.py
+# The joined COHA token stream (tokens + lexicon + texts metadata) as one lazy
+# frame, for tools that need more than COHA_Analysis.py's count products.
+# Discovery goes through the catalog and both joins use the dense id lookups.
+from pathlib import Path
+import polars as pl
+
+from COHA_Catalog import (
+    refresh_catalog, catalog_entries,
+    build_tokens_lazy, build_words_lazy, build_texts_lazy,
+)
+from COHA_Lexicon import build_dense_lexicon, build_dense_texts, dense_lookup
+
+BASE = Path("/Users/christopherjorgensen/Downloads").resolve()
+
+def _entries(catalog, kind, base):
+    # Prefer shards under Corpus/ (as COHA_Analysis.py does), else anywhere in BASE
+    return catalog_entries(catalog, kind=kind, under=base / "Corpus") or catalog_entries(catalog, kind=kind)
+
+def load_frames(base=BASE, catalog=None):
+    """Return normalized (lf_tokens, lf_words, lf_texts); any of them may be None."""
+    base = Path(base)
+    if catalog is None:
+        catalog = refresh_catalog(base, verbose=False)
+    return (
+        build_tokens_lazy(_entries(catalog, "tokens", base)),
+        build_words_lazy(_entries(catalog, "words", base)),
+        build_texts_lazy(_entries(catalog, "texts", base)),
+    )
+
+def texts_table(lf_texts):
+    # textID -> year, decade (derived from year when the export has none), genre
+    cols = lf_texts.collect_schema().names()
+    if "decade" not in cols and "year" in cols:
+        lf_texts = lf_texts.with_columns((pl.col("year") // 10 * 10).cast(pl.Int32).alias("decade"))
+    return lf_texts
+
+def token_shards(base=BASE, catalog=None):
+    # Catalog rows of the token shards, for tools that work one shard at a time
+    base = Path(base)
+    if catalog is None:
+        catalog = refresh_catalog(base, verbose=False)
+    return _entries(catalog, "tokens", base)
+
+def build_lookups(lf_words, lf_texts):
+    """
+    Materialize the small sides of both joins once: dense id-indexed tables
+    where the ids allow it, otherwise collected frames for a hash join.
+    """
+    lexicon = texts = None
+    if lf_words is not None:
+        lexicon = build_dense_lexicon(lf_words)
+        if lexicon is None:
+            lexicon = lf_words.collect()
+    if lf_texts is not None:
+        lf_texts = texts_table(lf_texts)
+        texts = build_dense_texts(lf_texts)
+        if texts is None:
+            texts = lf_texts.collect()
+    return lexicon, texts
+
+def apply_lookups(lf_tokens, lookups):
+    lf = lf_tokens
+    for table, key in zip(lookups, ("wordID","textID")):
+        if table is None:
+            continue
+        if isinstance(table, pl.DataFrame):
+            lf = lf.join(table.lazy(), on=key, how="left")
+        else:
+            lf = dense_lookup(lf, table)
+    return lf
+
+def token_stream(base=BASE, catalog=None):
+    """
+    Lazy frame of every token with textID, wordID, occID (when exported),
+    word/lemma/pos (Categorical) and year/decade/genre.
+    """
+    lf_tokens, lf_words, lf_texts = load_frames(base, catalog)
+    if lf_tokens is None:
+        raise FileNotFoundError(f"No token shards found under {base}")
+    return apply_lookups(lf_tokens, build_lookups(lf_words, lf_texts))
@@ -0,0 +1,66 @@
+# COHA_Survey.py
+# Footer-only schema survey of a COHA tree: every Parquet footer / CSV header is
+# read concurrently (bounded thread pool, see COHA_Catalog.probe_many) and the
+# result is one table of file -> schema -> classification.
+from pathlib import Path
+import sys
+import time
+import polars as pl
+
+from COHA_Catalog import classify, probe_many, walk_files
+
+BASE = Path("/Users/christopherjorgensen/Downloads/Corpus")
+WORKERS = 16
+
+# Same column hints COHA_Data_Anaylsis.py used for its candidate printout
+FULLTEXT_KEYS = ("text","body","content","full_text")
+LEXICON_KEYS  = ("lemma","word","pos","tag")
+METADATA_KEYS = ("year","decade","genre","section")
+
+SURVEY_SCHEMA = {
+    "path": pl.Utf8,
+    "columns": pl.List(pl.Utf8),
+    "dtypes": pl.List(pl.Utf8),
+    "rows": pl.Int64,
+    "kind": pl.Utf8,
+    "fulltext_candidate": pl.Boolean,
+    "lexicon_candidate": pl.Boolean,
+    "metadata_candidate": pl.Boolean,
+    "tokens": pl.Boolean,
+    "error": pl.Boolean,
+}
+
+def survey(paths, workers=WORKERS):
+    paths = [str(p) for p in paths]
+    rows = []
+    for p, (names, dtypes, nrows) in zip(paths, probe_many(paths, workers)):
+        lower = [n.lower() for n in names]
+        kind = classify(names)
+        rows.append({
+            "path": p,
+            "columns": names,
+            "dtypes": dtypes,
+            "rows": nrows,
+            "kind": kind,
+            "fulltext_candidate": any(k in lower for k in FULLTEXT_KEYS),
+            "lexicon_candidate": any(k in lower for k in LEXICON_KEYS),
+            "metadata_candidate": any(k in lower for k in METADATA_KEYS),
+            "tokens": kind == "tokens",
+            "error": not names,
+        })
+    return pl.DataFrame(rows, schema=SURVEY_SCHEMA)
+
+def survey_tree(base=BASE, workers=WORKERS):
+    return survey(walk_files(base), workers)
+
+
+if __name__ == "__main__":
+    base = Path(sys.argv[1]) if len(sys.argv) > 1 else BASE
+    t0 = time.perf_counter()
+    table = survey_tree(base)
+    dt = time.perf_counter() - t0
+    print(f"Surveyed {table.height} files under {base} in {dt:.2f}s with {WORKERS} workers")
+    print(table.group_by("kind").agg(pl.len().alias("files"), pl.col("rows").sum()).sort("kind"))
+    out = Path("coha_survey.parquet")  # kept out of the surveyed tree
+    table.write_parquet(out)
+    print("Wrote:", out)
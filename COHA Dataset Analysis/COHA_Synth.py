@@ -0,0 +1,129 @@
+# COHA_Synth.py
+# Synthetic COHA-shaped corpus for benchmarks, in the layout the pipeline expects:
+#
+#   <out>/Corpus/tokens/tokens_0000.parquet ...   textID, ID, wordID
+#   <out>/Corpus/Word_lemma_PoS/lexicon_00.parquet ...  wordID, word, lemma, PoS
+#   <out>/Sources/sources_00.parquet ...          textID, year, genre
+#
+# Word frequencies follow a Zipf law over the vocabulary (exponent ZIPF_S) and
+# several wordforms share a lemma, so the cube and top-k products see a long
+# tail like the real corpus. Text lengths are log-normal and texts run on across
+# shard boundaries. Column names vary from shard to shard the way the real
+# exports do (textID / textid / text_id, wordID / wordid / word_id, PoS / pos)
+# and some token shards carry their ids as strings. Shards are generated one at
+# a time, so memory stays at about one shard.
+from pathlib import Path
+import argparse
+import math
+import shutil
+import time
+import numpy as np
+import polars as pl
+
+TOKENS = 20_000_000
+SHARD_TOKENS = 2_000_000
+VOCAB = 200_000
+WORDS_PER_LEMMA = 3
+MEAN_TEXT_TOKENS = 2_000
+ZIPF_S = 1.05
+YEARS = (1810, 2009)
+GENRES = ("FIC","MAG","NEWS","NF")
+POS_TAGS = ("nn1","nn2","jj","vvi","vvd","vvg","rr","at","ii","cc","np1","vm","pp","mc")
+TEXTID_NAMES = ("textID","textid","text_id")
+WORDID_NAMES = ("wordID","wordid","word_id")
+POS_NAMES = ("PoS","pos")
+STRING_ID_SHARE = 0.1  # share of token shards with string ids
+DEMOCRACY_RANK = 1_000  # wordID relabelled to lemma "democracy" for the demo lookups
+
+def zipf_sampler(vocab, s, rng):
+    # Inverse-CDF sampling of 1-based ranks with P(r) ~ r^-s
+    cdf = np.cumsum(1.0 / np.arange(1, vocab + 1) ** s)
+    cdf /= cdf[-1]
+    return lambda n: np.searchsorted(cdf, rng.random(n), side="right") + 1
+
+def write_lexicon(out, vocab, rng, files=4):
+    d = out / "Corpus" / "Word_lemma_PoS"
+    d.mkdir(parents=True, exist_ok=True)
+    ids = np.arange(1, vocab + 1)
+    # frequent words get frequent lemmas: lemma rank follows word rank
+    lemma = (ids - 1) // WORDS_PER_LEMMA
+    lex = pl.DataFrame({
+        "wordID": ids,
+        "word": [f"w{i}" for i in ids],
+        "lemma": [f"l{i}" for i in lemma],
+        "pos": np.asarray(POS_TAGS)[rng.integers(0, len(POS_TAGS), vocab)],
+    }).with_columns(
+        pl.when(pl.col("wordID") == min(DEMOCRACY_RANK, vocab))
+        .then(pl.lit("democracy"))
+        .otherwise(pl.col("lemma"))
+        .alias("lemma")
+    )
+    for i, part in enumerate(lex.iter_slices(math.ceil(vocab / files))):
+        part.rename({"pos": POS_NAMES[i % len(POS_NAMES)]}).write_parquet(d / f"lexicon_{i:02d}.parquet")
+
+def write_texts(out, n_texts, rng, files=2):
+    d = out / "Sources"
+    d.mkdir(parents=True, exist_ok=True)
+    texts = pl.DataFrame({
+        "textID": np.arange(1, n_texts + 1),
+        "year": rng.integers(YEARS[0], YEARS[1] + 1, n_texts).astype(np.int32),
+        "genre": np.asarray(GENRES)[rng.integers(0, len(GENRES), n_texts)],
+    })
+    for i, part in enumerate(texts.iter_slices(math.ceil(n_texts / files))):
+        part.rename({"textID": TEXTID_NAMES[i % len(TEXTID_NAMES)]}).write_parquet(d / f"sources_{i:02d}.parquet")
+
+def generate(out, tokens=TOKENS, shard_tokens=SHARD_TOKENS, vocab=VOCAB, zipf_s=ZIPF_S, seed=0):
+    """
+    Write a synthetic corpus of about `tokens` tokens under `out` (replacing it).
+    Returns {"tokens", "texts", "shards", "vocab"}.
+    """
+    out = Path(out)
+    if out.exists():
+        shutil.rmtree(out)
+    rng = np.random.default_rng(seed)
+    t0 = time.perf_counter()
+
+    # text lengths first, so every textID is known before the shards are cut
+    lengths = []
+    total = 0
+    while total < tokens:
+        n = max(20, int(rng.lognormal(math.log(MEAN_TEXT_TOKENS), 0.8)))
+        n = min(n, tokens - total)
+        lengths.append(n)
+        total += n
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.r_[0, np.cumsum(lengths)]
+
+    sample = zipf_sampler(vocab, zipf_s, rng)
+    tok_dir = out / "Corpus" / "tokens"
+    tok_dir.mkdir(parents=True, exist_ok=True)
+    shards = math.ceil(total / shard_tokens)
+    for s in range(shards):
+        a, b = s * shard_tokens, min((s + 1) * shard_tokens, total)
+        text_of = np.searchsorted(starts, np.arange(a, b), side="right")   # 1-based textID
+        df = pl.DataFrame({"textID": text_of, "ID": np.arange(a, b), "wordID": sample(b - a)})
+        if rng.random() < STRING_ID_SHARE:
+            df = df.with_columns(pl.col("textID").cast(pl.Utf8), pl.col("wordID").cast(pl.Utf8))
+        df = df.rename({
+            "textID": TEXTID_NAMES[s % len(TEXTID_NAMES)],
+            "wordID": WORDID_NAMES[(s // len(TEXTID_NAMES)) % len(WORDID_NAMES)],
+        })
+        df.write_parquet(tok_dir / f"tokens_{s:04d}.parquet")
+
+    write_lexicon(out, vocab, rng)
+    write_texts(out, len(lengths), rng)
+    print(f"Synthetic corpus: {total} tokens, {len(lengths)} texts, {shards} shards, "
+          f"{vocab} words in {time.perf_counter() - t0:.1f}s -> {out}")
+    return {"tokens": total, "texts": len(lengths), "shards": shards, "vocab": vocab}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Write a synthetic COHA-shaped corpus")
+    ap.add_argument("out")
+    ap.add_argument("--tokens", type=int, default=TOKENS)
+    ap.add_argument("--shard-tokens", type=int, default=SHARD_TOKENS)
+    ap.add_argument("--vocab", type=int, default=VOCAB)
+    ap.add_argument("--zipf", type=float, default=ZIPF_S)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    generate(args.out, args.tokens, args.shard_tokens, args.vocab, args.zipf, args.seed)
@@ -0,0 +1,80 @@
+# COHA_TopK.py
+# Streaming top-k-per-group with bounded heaps.
+#
+# Rows arrive as a DataFrame, a LazyFrame (collected first, with the streaming
+# engine) or any iterable of DataFrame batches such as parquet_batches; only the
+# last keeps the input itself to one batch in memory. Every group keeps a
+# min-heap of at most k rows, so the result is groups x k and the cost is
+# O(n log k) instead of a global sort. Two vectorized filters keep the Python
+# heap work small: rows not above their group's current k-th value are dropped
+# in polars, and each batch is cut to its own top k per group before merging.
+# Ties keep the row seen first.
+import heapq
+import polars as pl
+
+BATCH_ROWS = 250_000
+
+def parquet_batches(path, batch_rows=BATCH_ROWS):
+    # Slices of a Parquet file; slice pushdown only reads the row groups needed
+    lf = pl.scan_parquet(str(path))
+    total = lf.select(pl.len()).collect().item()
+    for offset in range(0, total, batch_rows):
+        yield lf.slice(offset, batch_rows).collect()
+
+def _batches(source, batch_rows):
+    # (schema if known up front, batches)
+    if isinstance(source, pl.LazyFrame):
+        source = source.collect(streaming=True)
+    if isinstance(source, pl.DataFrame):
+        return source.schema, source.iter_slices(batch_rows)
+    return None, source
+
+def top_k_per_group(source, by, value, k, batch_rows=BATCH_ROWS):
+    """
+    Top `k` rows by `value` (descending) for every group of `by` columns.
+    Returns a DataFrame sorted by the group columns, then `value` descending;
+    empty input gives an empty frame with the input's columns.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    heaps, seq, columns = {}, 0, None
+    schema, batches = _batches(source, batch_rows)
+    for batch in batches:
+        if columns is None:
+            columns, schema = batch.columns, batch.schema
+            key_idx = [columns.index(c) for c in by]
+            val_idx = columns.index(value)
+        batch = batch.filter(pl.col(value).is_not_null())
+        if batch.height == 0:
+            continue
+        # 1. drop rows that cannot beat a full group's current k-th value
+        full = [(key, h[0][0]) for key, h in heaps.items() if len(h) == k]
+        if full:
+            thr = pl.DataFrame(
+                [dict(zip(by, key), _thr=v) for key, v in full],
+                schema={**{c: schema[c] for c in by}, "_thr": schema[value]},
+            )
+            batch = (
+                batch.join(thr, on=by, how="left", join_nulls=True)
+                .filter(pl.col("_thr").is_null() | (pl.col(value) > pl.col("_thr")))
+                .drop("_thr")
+            )
+        # 2. keep only this batch's own top k per group
+        batch = batch.filter(pl.col(value).rank("ordinal", descending=True).over(by) <= k)
+        # 3. merge survivors into the per-group heaps
+        for row in batch.iter_rows():
+            seq += 1
+            entry = (row[val_idx], -seq, row)
+            h = heaps.setdefault(tuple(row[i] for i in key_idx), [])
+            if len(h) < k:
+                heapq.heappush(h, entry)
+            elif entry > h[0]:
+                heapq.heapreplace(h, entry)
+
+    if not heaps:
+        # no batches at all from an iterable: the group and value columns, untyped
+        return pl.DataFrame(schema=schema or {**{c: pl.Null for c in by}, value: pl.Null})
+    rows = [e[2] for h in heaps.values() for e in h]
+    return (
+        pl.DataFrame(rows, schema=schema, orient="row")
+        .sort([*by, value], descending=[False] * len(by) + [True], nulls_last=True)
+    )
@@ -0,0 +1,126 @@
+# COHA_Trends.py
+# Lemma trend lookups over the year x lemma x pos cube, loaded once into memory.
+#
+#   python COHA_Trends.py democracy freedom    # print trends and exit
+#   python COHA_Trends.py                      # interactive prompt
+#   python COHA_Trends.py --serve 8765         # GET /trend?lemma=democracy,freedom[&pos=nn1]
+#
+# Every lemma (and lemma/pos pair) maps to its sorted years and counts, and the
+# per-year token totals are kept for per-million normalization, so a lookup is
+# a dict access plus one pass over at most a couple of hundred years.
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import argparse
+import json
+import time
+import polars as pl
+
+BASE = Path("/Users/christopherjorgensen/Downloads").resolve()
+CUBE_PATH = BASE / "out_by_year_lemma_pos.parquet"
+
+def _series_index(df, keys):
+    # Rows are sorted by year first, so each group's lists come out in year order
+    grouped = df.sort("year").group_by(keys, maintain_order=True).agg(pl.col("year"), pl.col("n"))
+    key = grouped[keys[0]] if len(keys) == 1 else grouped.select(keys).rows()
+    return dict(zip(key, zip(grouped["year"].to_list(), grouped["n"].to_list())))
+
+def build_index(cube):
+    """
+    `cube` needs year, lemma and n (pos optional). Returns
+    {"lemma": {lemma: (years, counts)}, "lemma_pos": {(lemma, pos): (years, counts)},
+     "totals": {year: tokens in that year}}.
+    """
+    by_lemma = cube.group_by(["lemma","year"]).agg(pl.col("n").sum())
+    index = {
+        "lemma": _series_index(by_lemma, ["lemma"]),
+        "lemma_pos": {},
+        "totals": dict(cube.group_by("year").agg(pl.col("n").sum()).drop_nulls("year").iter_rows()),
+    }
+    if "pos" in cube.columns:
+        index["lemma_pos"] = _series_index(cube.select(["lemma","pos","year","n"]), ["lemma","pos"])
+    return index
+
+def load_index(path=CUBE_PATH):
+    t0 = time.perf_counter()
+    index = build_index(pl.read_parquet(path))
+    print(f"Loaded {len(index['lemma'])} lemmas from {path} in {time.perf_counter() - t0:.1f}s")
+    return index
+
+def trend(index, lemma, pos=None):
+    years, counts = (
+        index["lemma_pos"].get((lemma, pos)) if pos else index["lemma"].get(lemma)
+    ) or ([], [])
+    totals = index["totals"]
+    return [
+        {"year": y, "n": n, "per_million": n * 1e6 / totals[y] if totals.get(y) else None}
+        for y, n in zip(years, counts)
+    ]
+
+def trends(index, lemmas, pos=None):
+    return {lemma: trend(index, lemma, pos) for lemma in lemmas}
+
+def trends_frame(index, lemmas, pos=None):
+    rows = [{"lemma": lemma, **r} for lemma, rs in trends(index, lemmas, pos).items() for r in rs]
+    schema = {"lemma": pl.Utf8, "year": pl.Int32, "n": pl.Int64, "per_million": pl.Float64}
+    return pl.DataFrame(rows, schema=schema)
+
+# ---- front ends ----
+def repl(index, pos=None):
+    print("Enter lemmas separated by spaces or commas (blank line to quit).")
+    while True:
+        try:
+            line = input("lemma> ").strip()
+        except EOFError:
+            break
+        if not line:
+            break
+        lemmas = [w for w in line.replace(",", " ").split() if w]
+        t0 = time.perf_counter()
+        df = trends_frame(index, lemmas, pos)
+        dt = (time.perf_counter() - t0) * 1000
+        with pl.Config(tbl_rows=50):
+            print(df)
+        print(f"{len(lemmas)} lemmas in {dt:.2f} ms")
+
+def serve(index, port):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/trend":
+                self.send_error(404, "use /trend?lemma=a,b[&pos=tag]")
+                return
+            qs = parse_qs(url.query)
+            lemmas = [w for v in qs.get("lemma", []) for w in v.split(",") if w]
+            pos = qs.get("pos", [None])[0]
+            body = json.dumps(trends(index, lemmas, pos)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Serving lemma trends on http://127.0.0.1:{port}/trend?lemma=democracy")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Raw and per-million lemma trends from the COHA cube")
+    ap.add_argument("lemmas", nargs="*")
+    ap.add_argument("--pos", default=None, help="restrict to one PoS tag")
+    ap.add_argument("--cube", default=str(CUBE_PATH), help="year x lemma x pos Parquet cube")
+    ap.add_argument("--serve", type=int, metavar="PORT", help="run the local HTTP endpoint")
+    args = ap.parse_args()
+
+    index = load_index(args.cube)
+    if args.serve:
+        serve(index, args.serve)
+    elif args.lemmas:
+        with pl.Config(tbl_rows=50):
+            print(trends_frame(index, args.lemmas, args.pos))
+    else:
+        repl(index, args.pos)
@@ -0,0 +1,218 @@
+# COHA_Vectors.py
+# Per-decade PPMI/SVD lemma vectors for semantic change analysis.
+#
+# Built from the compact corpus store (COHA_Store.py), one decade per worker
+# process:
+#
+#   1. the VOCAB_SIZE most frequent lemmas form a shared vocabulary, so every
+#      decade's vectors have the same rows
+#   2. each decade's texts are read in chunks of ~CHUNK_TOKENS tokens and their
+#      co-occurrences within +-WINDOW lemmas (inside one text) are summed into a
+#      sparse V x V SciPy CSR matrix, chunk by chunk
+#   3. PPMI with context-distribution smoothing (alpha = 0.75), then a truncated
+#      randomized SVD (Halko et al.): vectors = U * sqrt(S), DIM columns
+#   4. decades are aligned in time order with orthogonal Procrustes, each onto
+#      the already aligned previous decade, over lemmas seen in both
+#
+# Memory per worker is one chunk plus the decade's sparse matrix and a V x DIM
+# dense block. Output in COHA_vectors/: vocab.json, vectors_<decade>.npy,
+# counts_<decade>.npy and out_semantic_change.parquet (cosine distance of
+# each lemma between consecutive decades).
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import os
+import time
+import numpy as np
+import polars as pl
+from scipy import sparse
+from scipy.linalg import orthogonal_procrustes
+
+from COHA_Store import BASE, STORE_DIR, NULL_CODE, NULL_INT, open_store, text_decades
+
+VECTORS_DIR = BASE / "COHA_vectors"
+VOCAB_SIZE = 50_000
+WINDOW = 4
+DIM = 300
+CHUNK_TOKENS = 10_000_000
+CDS_ALPHA = 0.75
+MIN_SHARED = 100   # lemmas per decade needed for a Procrustes fit
+
+def _lemma_ids(store, tokens):
+    codes, _ = store["lexicon"]["lemma"]
+    out = np.full(len(tokens), NULL_CODE, dtype=np.uint32)
+    ok = tokens < len(codes)
+    out[ok] = codes[tokens[ok]]
+    return out
+
+def build_vocab(store, size=VOCAB_SIZE, chunk=CHUNK_TOKENS):
+    dictionary = store["lexicon"]["lemma"][1]
+    counts = np.zeros(len(dictionary), dtype=np.int64)
+    tokens = store["tokens"]
+    for a in range(0, len(tokens), chunk):
+        ids = _lemma_ids(store, tokens[a:a + chunk])
+        counts += np.bincount(ids[ids != NULL_CODE], minlength=len(dictionary))
+    top = np.argsort(-counts, kind="stable")[:size]
+    return top[counts[top] > 0]
+
+def _decade_chunks(offsets, texts, chunk_tokens):
+    lengths = offsets[texts + 1] - offsets[texts]
+    ends = np.cumsum(lengths)
+    start = 0
+    while start < len(texts):
+        stop = int(np.searchsorted(ends, ends[start] - lengths[start] + chunk_tokens, side="right"))
+        stop = max(stop, start + 1)
+        yield texts[start:stop]
+        start = stop
+
+def cooccurrence_matrix(store, decade, vocab_codes, window=WINDOW, chunk_tokens=CHUNK_TOKENS):
+    V = len(vocab_codes)
+    slot = np.full(len(store["lexicon"]["lemma"][1]) + 1, -1, dtype=np.int64)
+    slot[vocab_codes] = np.arange(V)
+    offsets = store["offsets"]
+    texts = np.flatnonzero(text_decades(store) == decade)
+    texts = texts[offsets[texts + 1] > offsets[texts]]
+    M = sparse.csr_matrix((V, V), dtype=np.float64)
+    for batch in _decade_chunks(offsets, texts, chunk_tokens):
+        lengths = offsets[batch + 1] - offsets[batch]
+        first = np.cumsum(lengths) - lengths
+        pos = np.arange(int(lengths.sum())) - np.repeat(first, lengths) + np.repeat(offsets[batch], lengths)
+        ids = _lemma_ids(store, store["tokens"][pos])
+        ids = slot[np.where(ids == NULL_CODE, len(slot) - 1, ids)]
+        text_of = np.repeat(np.arange(len(batch)), lengths)
+        rows, cols = [], []
+        for k in range(1, window + 1):
+            m = (text_of[:-k] == text_of[k:]) & (ids[:-k] >= 0) & (ids[k:] >= 0)
+            rows += [ids[:-k][m], ids[k:][m]]
+            cols += [ids[k:][m], ids[:-k][m]]
+        if rows:
+            r, c = np.concatenate(rows), np.concatenate(cols)
+            M = M + sparse.csr_matrix((np.ones(len(r)), (r, c)), shape=(V, V))
+    return M
+
+def ppmi(M, alpha=CDS_ALPHA):
+    M = M.tocsr()
+    total = M.sum()
+    if total == 0:
+        return M
+    row = np.asarray(M.sum(axis=1)).ravel()
+    ctx = np.asarray(M.sum(axis=0)).ravel() ** alpha
+    ctx /= ctx.sum()
+    r = np.repeat(np.arange(M.shape[0]), np.diff(M.indptr))
+    pmi = np.log(M.data * 1.0 / total) - np.log(row[r] / total) - np.log(ctx[M.indices])
+    out = sparse.csr_matrix((np.maximum(pmi, 0), M.indices.copy(), M.indptr.copy()), shape=M.shape)
+    out.eliminate_zeros()
+    return out
+
+def randomized_svd(A, k, oversample=10, n_iter=4, seed=0):
+    # Halko, Martinsson & Tropp: range finder with power iterations
+    rng = np.random.default_rng(seed)
+    k = min(k, min(A.shape))
+    Q = A @ rng.standard_normal((A.shape[1], k + oversample))
+    for _ in range(n_iter):
+        Q, _ = np.linalg.qr(Q)
+        Q, _ = np.linalg.qr(A.T @ Q)
+        Q = A @ Q
+    Q, _ = np.linalg.qr(Q)
+    U, S, _ = np.linalg.svd((A.T @ Q).T, full_matrices=False)
+    return (Q @ U)[:, :k], S[:k]
+
+def decade_vectors(args):
+    # Worker: one decade from counts to saved vectors
+    store_dir, out_dir, decade, vocab_codes, window, dim, chunk_tokens = args
+    t0 = time.perf_counter()
+    store = open_store(store_dir)
+    M = cooccurrence_matrix(store, decade, vocab_codes, window, chunk_tokens)
+    counts = np.asarray(M.sum(axis=1)).ravel()
+    U, S = randomized_svd(ppmi(M), dim)
+    np.save(Path(out_dir) / f"vectors_{decade}.npy", (U * np.sqrt(S)).astype(np.float32))
+    np.save(Path(out_dir) / f"counts_{decade}.npy", counts)
+    return decade, M.nnz, time.perf_counter() - t0
+
+def align(out_dir, decades):
+    # Rotate every decade onto the previous aligned one, in place
+    prev = None
+    for d in decades:
+        X = np.load(out_dir / f"vectors_{d}.npy")
+        seen = np.load(out_dir / f"counts_{d}.npy") > 0
+        if prev is not None:
+            P, prev_seen = prev
+            shared = seen & prev_seen
+            if shared.sum() >= MIN_SHARED:
+                R, _ = orthogonal_procrustes(X[shared], P[shared])
+                X = (X @ R).astype(np.float32)
+                np.save(out_dir / f"vectors_{d}.npy", X)
+        prev = (X, seen)
+
+def semantic_change(out_dir, decades, vocab):
+    frames = []
+    for a, b in zip(decades, decades[1:]):
+        A, B = np.load(out_dir / f"vectors_{a}.npy"), np.load(out_dir / f"vectors_{b}.npy")
+        seen = (np.load(out_dir / f"counts_{a}.npy") > 0) & (np.load(out_dir / f"counts_{b}.npy") > 0)
+        norm = np.linalg.norm(A, axis=1) * np.linalg.norm(B, axis=1)
+        cos = np.divide((A * B).sum(axis=1), norm, out=np.zeros(len(A)), where=norm > 0)
+        frames.append(pl.DataFrame({
+            "lemma": np.asarray(vocab)[seen], "decade": b, "prev_decade": a, "cos_distance": 1 - cos[seen],
+        }))
+    if not frames:
+        return pl.DataFrame()
+    return pl.concat(frames).sort(["decade","cos_distance"], descending=[False, True])
+
+def build_vectors(store_dir=STORE_DIR, out_dir=None, vocab_size=VOCAB_SIZE, window=WINDOW, dim=DIM,
+                  workers=None, chunk_tokens=CHUNK_TOKENS):
+    store_dir = Path(store_dir)
+    out_dir = Path(out_dir) if out_dir else store_dir.parent / "COHA_vectors"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    store = open_store(store_dir)
+    vocab_codes = build_vocab(store, vocab_size)
+    vocab = [store["lexicon"]["lemma"][1][c] for c in vocab_codes]
+    (out_dir / "vocab.json").write_text(json.dumps(vocab))
+    decades = sorted(int(d) for d in np.unique(text_decades(store)) if d != NULL_INT)
+    print(f"Vocabulary {len(vocab)} lemmas, {len(decades)} decades")
+
+    jobs = [(str(store_dir), str(out_dir), d, vocab_codes, window, dim, chunk_tokens) for d in decades]
+    workers = workers or min(len(jobs), os.cpu_count() or 1) or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for decade, nnz, dt in pool.map(decade_vectors, jobs):
+            print(f"  {decade}s: {nnz} co-occurrence cells in {dt:.1f}s")
+
+    align(out_dir, decades)
+    change = semantic_change(out_dir, decades, vocab)
+    change.write_parquet(out_dir / "out_semantic_change.parquet")
+    print(f"Built vectors in {time.perf_counter() - t0:.1f}s -> {out_dir}")
+    return out_dir
+
+def load_vectors(out_dir=VECTORS_DIR):
+    out_dir = Path(out_dir)
+    vocab = json.loads((out_dir / "vocab.json").read_text())
+    decades = sorted(int(p.stem.split("_")[1]) for p in out_dir.glob("vectors_*.npy"))
+    return {
+        "vocab": vocab,
+        "lookup": {w: i for i, w in enumerate(vocab)},
+        "vectors": {d: np.load(out_dir / f"vectors_{d}.npy", mmap_mode="r") for d in decades},
+    }
+
+def neighbors(vectors, lemma, decade, k=10):
+    i = vectors["lookup"].get(lemma)
+    if i is None:
+        return []
+    X = np.asarray(vectors["vectors"][decade])
+    norms = np.linalg.norm(X, axis=1)
+    sims = np.divide(X @ X[i], norms * norms[i], out=np.zeros(len(X)), where=norms > 0)
+    sims[i] = -np.inf
+    best = np.argsort(-sims)[:k]
+    return [(vectors["vocab"][j], float(sims[j])) for j in best]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Per-decade PPMI/SVD lemma vectors from the COHA store")
+    ap.add_argument("--store", default=str(STORE_DIR))
+    ap.add_argument("--vocab", type=int, default=VOCAB_SIZE)
+    ap.add_argument("--window", type=int, default=WINDOW)
+    ap.add_argument("--dim", type=int, default=DIM)
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+    out = build_vectors(args.store, vocab_size=args.vocab, window=args.window, dim=args.dim, workers=args.workers)
+    print(pl.read_parquet(out / "out_semantic_change.parquet").group_by("decade", maintain_order=True).head(3))
@@ -1,12 +1,12 @@
 from pathlib import Path
 import polars as pl
 
+from COHA_Survey import survey_tree
+
 BASE = Path("/Users/christopherjorgensen/Downloads/Corpus")
 
-for p in BASE.rglob("*.parquet"):
-    try:
-        sch = pl.scan_parquet(str(p)).collect_schema()
-        if any(c.lower() in ("text","body","content","full_text") for c in sch.names()):
-            print("FULL TEXT FOUND IN:", p, sch)
-    except:
-        pass
\ No newline at end of file
+found = survey_tree(BASE).filter(pl.col("fulltext_candidate"))
+for r in found.iter_rows(named=True):
+    print("FULL TEXT FOUND IN:", r["path"], dict(zip(r["columns"], r["dtypes"])))
+if found.height == 0:
+    print("No full-text column; rebuild the texts with: python COHA_Documents.py docs.jsonl")
@@ -0,0 +1,176 @@
+# bench_coha.py
+# Times the COHA pipeline stage by stage on a synthetic corpus (COHA_Synth.py):
+# discovery (cold and warm catalog), normalization, the wordID/textID joins
+# (dense and hash), the count cube, every product of write_products, and
+# COHA_Analysis.py end to end. Each stage runs in a fresh process, so the peak
+# RSS reported is that stage's own. Results go to a JSON file; pass a previous
+# one as --baseline to flag stages that got slower than --tolerance.
+#
+#   python bench_coha.py --tokens 20000000             # generate + run
+#   python bench_coha.py --baseline bench_coha.json    # compare against a saved run
+from pathlib import Path
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import subprocess
+import sys
+import time
+import polars as pl
+
+from COHA_Catalog import CATALOG_NAME, refresh_catalog
+from COHA_Cube import CUBE_KEYS, product_frames
+from COHA_Stream import load_frames, texts_table, build_lookups, apply_lookups, token_stream
+from COHA_Synth import TOKENS, SHARD_TOKENS, VOCAB, generate
+
+BENCH_BASE = Path("/tmp/coha_bench")
+TOLERANCE = 1.25
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+def _tokens(base):
+    lf_tokens, _, _ = load_frames(base)
+    return lf_tokens
+
+# ---- stages: each returns [(label, seconds, rows), ...] ----
+def stage_discovery(base):
+    (Path(base) / CATALOG_NAME).unlink(missing_ok=True)
+    out = []
+    for label in ("discovery (cold)", "discovery (warm)"):
+        t0 = time.perf_counter()
+        catalog = refresh_catalog(base, verbose=False)
+        out.append((label, time.perf_counter() - t0, catalog.height))
+    return out
+
+def stage_normalize(base):
+    t0 = time.perf_counter()
+    lf = _tokens(base)
+    df = lf.select(pl.len(), pl.col("textID").max(), pl.col("wordID").max()).collect(streaming=True)
+    return [("normalize tokens", time.perf_counter() - t0, df.item(0, 0))]
+
+def _join_stats(lf):
+    return lf.select(pl.len(), pl.col("lemma").null_count(), pl.col("year").null_count()).collect(streaming=True)
+
+def stage_join_dense(base):
+    t0 = time.perf_counter()
+    lf_tokens, lf_words, lf_texts = load_frames(base)
+    df = _join_stats(apply_lookups(lf_tokens, build_lookups(lf_words, lf_texts)))
+    return [("join (dense)", time.perf_counter() - t0, df.item(0, 0))]
+
+def stage_join_hash(base):
+    t0 = time.perf_counter()
+    lf_tokens, lf_words, lf_texts = load_frames(base)
+    lf = (
+        lf_tokens
+        .join(lf_words.collect().lazy(), on="wordID", how="left")
+        .join(texts_table(lf_texts).collect().lazy(), on="textID", how="left")
+    )
+    df = _join_stats(lf)
+    return [("join (hash)", time.perf_counter() - t0, df.item(0, 0))]
+
+def stage_cube(base):
+    t0 = time.perf_counter()
+    lf = token_stream(base)
+    keys = [c for c in CUBE_KEYS if c in lf.collect_schema().names()]
+    cube = (
+        lf.group_by(keys).agg(pl.len().alias("n"))
+        .collect(streaming=True)
+        .with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+    )
+    dt = time.perf_counter() - t0
+    cube.write_parquet(Path(base) / "out_count_cube.parquet")
+    return [("cube", dt, int(cube["n"].sum()))]
+
+def stage_products(base):
+    cube = pl.read_parquet(Path(base) / "out_count_cube.parquet")
+    out, it = [], product_frames(cube)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            stem, df = next(it)
+        except StopIteration:
+            break
+        out.append((f"product {stem}", time.perf_counter() - t0, cube.height))
+    return out
+
+def stage_analysis(base):
+    # COHA_Analysis.py end to end, against the synthetic BASE
+    script = Path(__file__).resolve().parent / "COHA_Analysis.py"
+    env = {**os.environ, "COHA_BASE": str(base)}
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, str(script)], env=env, cwd=script.parent, check=True, stdout=subprocess.DEVNULL)
+    dt = time.perf_counter() - t0
+    tokens = _tokens(base).select(pl.len()).collect().item()
+    return [("COHA_Analysis.py", dt, tokens, peak_rss_mb(resource.RUSAGE_CHILDREN))]
+
+STAGES = {
+    "discovery": stage_discovery,
+    "normalize": stage_normalize,
+    "join_dense": stage_join_dense,
+    "join_hash": stage_join_hash,
+    "cube": stage_cube,
+    "products": stage_products,
+    "analysis": stage_analysis,
+}
+
+def _measure(name, base):
+    rows = STAGES[name](base)
+    rss = peak_rss_mb()
+    return [
+        {"stage": r[0], "seconds": r[1], "rows": r[2], "rows_per_sec": r[2] / r[1] if r[1] else None,
+         "peak_rss_mb": r[3] if len(r) > 3 else rss}
+        for r in rows
+    ]
+
+def run(base, stages=None):
+    results = []
+    ctx = mp.get_context("spawn")
+    for name in stages or STAGES:
+        # a fresh process per stage: its peak RSS is not inflated by earlier stages
+        with ctx.Pool(1) as pool:
+            for r in pool.apply(_measure, (name, str(base))):
+                print(f"{r['stage']:<40} {r['seconds']:8.2f}s  {r['rows_per_sec'] or 0:14,.0f} rows/s  "
+                      f"peak RSS {r['peak_rss_mb']:8.1f} MB")
+                results.append(r)
+    return results
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    old = {r["stage"]: r for r in baseline["results"]}
+    slower = []
+    for r in results:
+        prev = old.get(r["stage"])
+        if prev and prev["seconds"] > 0 and r["seconds"] > prev["seconds"] * tolerance:
+            slower.append(r["stage"])
+            print(f"REGRESSION {r['stage']}: {prev['seconds']:.2f}s -> {r['seconds']:.2f}s")
+    return slower
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Stage timings of the COHA pipeline on a synthetic corpus")
+    ap.add_argument("--base", default=str(BENCH_BASE), help="synthetic corpus directory")
+    ap.add_argument("--tokens", type=int, default=TOKENS)
+    ap.add_argument("--shard-tokens", type=int, default=SHARD_TOKENS)
+    ap.add_argument("--vocab", type=int, default=VOCAB)
+    ap.add_argument("--regen", action="store_true", help="regenerate the corpus even if it exists")
+    ap.add_argument("--stages", nargs="*", choices=list(STAGES))
+    ap.add_argument("--out", default="bench_coha.json")
+    ap.add_argument("--baseline", help="previous --out file to compare against")
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = ap.parse_args()
+
+    base = Path(args.base)
+    if args.regen or not (base / "Corpus").exists():
+        corpus = generate(base, args.tokens, args.shard_tokens, args.vocab)
+    else:
+        corpus = {"base": str(base)}
+    results = run(base, args.stages)
+    report = {"when": time.strftime("%Y-%m-%d %H:%M:%S"), "corpus": corpus, "polars": pl.__version__, "results": results}
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print("Wrote:", args.out)
+    if args.baseline:
+        slower = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        sys.exit(1 if slower else 0)
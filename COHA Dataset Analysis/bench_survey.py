@@ -0,0 +1,39 @@
+# bench_survey.py
+# Times the footer-only survey of BASE at increasing thread-pool sizes.
+#
+# An untimed warm-up pass reads every footer first, so no pool size is measured
+# against a cold page cache. Each size is then timed REPEATS times, in
+# alternating order (ascending, then descending, ...), and the median is reported.
+from pathlib import Path
+import statistics
+import sys
+import time
+
+from COHA_Catalog import walk_files
+from COHA_Survey import survey
+
+BASE = Path("/Users/christopherjorgensen/Downloads/Corpus")
+WORKER_COUNTS = [1, 2, 4, 8, 16, 32, 64]
+REPEATS = 3
+
+base = Path(sys.argv[1]) if len(sys.argv) > 1 else BASE
+paths = list(walk_files(base))
+print(f"{len(paths)} files under {base}")
+
+t0 = time.perf_counter()
+survey(paths, workers=max(WORKER_COUNTS))
+print(f"warm-up  {time.perf_counter() - t0:8.3f}s")
+
+times = {w: [] for w in WORKER_COUNTS}
+errors = {}
+for r in range(REPEATS):
+    for w in WORKER_COUNTS if r % 2 == 0 else WORKER_COUNTS[::-1]:
+        t0 = time.perf_counter()
+        table = survey(paths, workers=w)
+        times[w].append(time.perf_counter() - t0)
+        errors[w] = table["error"].sum()
+
+baseline = statistics.median(times[WORKER_COUNTS[0]])
+for w in WORKER_COUNTS:
+    dt = statistics.median(times[w])
+    print(f"workers={w:>3}  {dt:8.3f}s  {len(paths)/dt:10.1f} files/s  speedup x{baseline/dt:5.2f}  errors={errors[w]}")
@@ -1,10 +1,16 @@
 import polars as pl
 
-# Inspect the lemma cube
-df = pl.read_parquet("/Users/christopherjorgensen/Downloads/out_by_year_lemma_pos.parquet")
-print(df.head(10))
-print(df.filter((pl.col("lemma")=="democracy")).sort("year").head(10))
+from COHA_IPC import open_ipc, lookup, lemma_trend
+
+# The Arrow copies of the products are memory-mapped, not read: opening them is
+# instant and only the rows a lookup touches are paged in
+cube = open_ipc("/Users/christopherjorgensen/Downloads/out_by_year_lemma_pos.arrow")
+totals = open_ipc("/Users/christopherjorgensen/Downloads/out_year_totals.arrow")
+print(cube["frame"].head(10))
+
+# Lemma trends: binary search on the lemma-sorted cube
+print(lemma_trend(cube, totals, "democracy").head(10))
 
 # Top 50 lemmas per year
-top = pl.read_parquet("/Users/christopherjorgensen/Downloads/out_top50_lemmas_per_year.parquet")
-print(top.filter(pl.col("year")==1900))
\ No newline at end of file
+top = open_ipc("/Users/christopherjorgensen/Downloads/out_top50_lemmas_per_year.arrow")
+print(lookup(top, 1900))
\ No newline at end of file
@@ -3,6 +3,11 @@ from transformers import pipeline
 import requests
 from bs4 import BeautifulSoup
 import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from expert_emotion import classify_emotions, get_cache
 
 # Simple persuasion heuristic: modal-verb density
 MODALS = {"should", "must", "could", "would", "may", "might", "shall", "will"}
@@ -48,9 +53,13 @@ for p in soup.find_all("p"):
 # 2. Load pipelines
 emo_pipe = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base")
 
+# One batched pass over all quotes (a paragraph naming two experts is classified
+# once, and quotes seen on an earlier run come from the shared emotion cache)
+emotions_per_row = classify_emotions([row["quote"] for row in data], emo_pipe)
+print(get_cache().report())
+
 results = []
-for row in data:
-    emotions = emo_pipe(row["quote"])[0]             # e.g. {"label":"joy", "score":0.87}
+for row, emotions in zip(data, emotions_per_row):   # e.g. {"label":"joy", "score":0.87}
     persuasion_score = compute_persuasion(row["quote"])
     results.append({
         "expert": row["expert"],
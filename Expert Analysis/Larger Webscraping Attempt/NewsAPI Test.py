@@ -4,11 +4,16 @@
 import os
 import re
 import csv
+import sys
 import requests
 import pandas as pd
+from pathlib import Path
 from transformers import pipeline
 from datetime import datetime, timedelta
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from expert_emotion import classify_emotions, get_cache
+
 # ─────────────── Configuration ───────────────
 # Use environment variable if set, otherwise fall back to hard-coded key
 API_KEY = os.getenv("NEWSAPI_KEY", "70d976ea22714da9911aeb4c16d8d37a")
@@ -85,11 +90,9 @@ def main():
         url       = art.get("url","")
         published = art.get("publishedAt","")
 
-        for field in ("title","description","content"):
-            text = locals()[field]
+        for field, text in (("title", title), ("description", desc), ("content", content)):
             for match in EXPERT_PATTERN.finditer(text):
                 expert  = match.group(0)
-                emo     = emo_pipe(text)[0]
                 pers    = round(compute_persuasion(text), 3)
                 records.append({
                     "source":        source,
@@ -99,8 +102,6 @@ def main():
                     "field":         field,
                     "expert":        expert,
                     "text":          text.strip(),
-                    "emotion":       emo["label"],
-                    "emotion_score": emo["score"],
                     "persuasion":    pers
                 })
 
@@ -108,6 +109,13 @@ def main():
         print("No expert mentions found.")
         return
 
+    # Classify all mentions in one batched pass: each distinct text once, and
+    # texts already in the shared emotion cache not at all
+    for rec, emo in zip(records, classify_emotions([r["text"] for r in records], emo_pipe)):
+        rec["emotion"]       = emo["label"]
+        rec["emotion_score"] = emo["score"]
+    print(get_cache().report())
+
     fieldnames = [
         "source","author","url","publishedAt",
         "field","expert","text",
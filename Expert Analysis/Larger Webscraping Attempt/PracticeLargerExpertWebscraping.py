@@ -1,8 +1,41 @@
 #!/usr/bin/env python3
+# Expert quotes, their emotion and a persuasion score over all-the-news.
+#
+#   python PracticeLargerExpertWebscraping.py                      # one worker per core
+#   python PracticeLargerExpertWebscraping.py --workers 1          # in-process, no pool
+#   python PracticeLargerExpertWebscraping.py --infer-workers 2    # two model processes
+#
+# The CSV is read CHUNK_ROWS articles at a time. Sentence splitting,
+# EXPERT_PATTERN matching and compute_persuasion run on those chunks in a pool
+# of --workers processes, which never load the model. Their candidates are
+# funnelled to --infer-workers separate processes that each hold one copy of the
+# emotion pipeline and classify them in batches (through the shared cache).
+# Before any sentence splitting, a chunk's articles go through one Aho-Corasick
+# scan for the HONORIFICS literals; most have none and are dropped there, and in
+# the rest only sentences containing one reach EXPERT_PATTERN.
+# At most a few chunks per worker are in flight, so memory does not grow with
+# the size of the file, and results come back in article order.
+#
+# Every finished chunk is written straight away as one Parquet file (a single
+# row group, expert and emotion_label dictionary-encoded) under OUTPUT_DIR, and
+# its article range is then appended to OUTPUT_DIR/_manifest.jsonl. A restarted
+# run skips every range in the manifest, so nothing is scanned or classified
+# twice; --fresh starts over. The CSV is exported from the parts at the end.
+import argparse
+import json
 import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
 import re
 import csv
-from transformers import pipeline
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from expert_emotion import BATCH_SIZE, classify_emotions, get_cache
 
 # ──────────────── Config ─────────────────
 import os
@@ -21,12 +54,27 @@ else:
     print(f"Error: input file not found. Checked: {_CANDIDATE_PATHS}")
     exit(1)
 OUTPUT_CSV = "expert_analysis_all_news.csv"
-# Initialize Hugging Face emotion pipeline
-emo_pipe = pipeline(
-    "text-classification",
-    model="j-hartmann/emotion-english-distilroberta-base",
-    return_all_scores=False
-)
+# Parquet parts and the checkpoint manifest
+OUTPUT_DIR = "expert_analysis_all_news"
+MANIFEST = "_manifest.jsonl"
+# Articles per chunk: the unit read from the CSV, scanned by one worker and
+# whose candidate sentences are classified together
+CHUNK_ROWS = 2000
+WORKERS = os.cpu_count() or 1
+# Processes holding a copy of the model; the cores are split between them
+INFER_WORKERS = 1
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+# Hugging Face emotion pipeline, loaded on first use so scanning workers never load it
+emo_pipe = None
+
+
+def get_pipe():
+    global emo_pipe
+    if emo_pipe is None:
+        from transformers import pipeline
+        emo_pipe = pipeline("text-classification", model=EMOTION_MODEL, return_all_scores=False)
+    return emo_pipe
+
 # Persuasion heuristic: modal‐verb density
 MODALS = {"should", "must", "could", "would", "may", "might", "shall", "will"}
 
@@ -40,63 +88,265 @@ def compute_persuasion(text):
 EXPERT_PATTERN = re.compile(
     r"\b(?:Dr|Prof|Professor|Mr|Ms|Mrs)\.?\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*"
 )
+# Literals every EXPERT_PATTERN match contains ("Prof" and "Mr" also cover
+# "Professor" and "Mrs"): text without any of them cannot hold an expert
+HONORIFICS = ["Dr", "Prof", "Mr", "Ms"]
 # Sentence splitter
 SENT_SPLIT = re.compile(r"(?<=[\.!?])\s+")
 
 
+def has_honorific(text):
+    return any(h in text for h in HONORIFICS)
+
+
+def honorific_mask(contents):
+    # One vectorized multi-literal scan over a chunk; missing content (NaN) is False
+    texts = pl.Series([c if isinstance(c, str) else None for c in contents], dtype=pl.Utf8)
+    return texts.str.contains_any(HONORIFICS).fill_null(False).to_list()
+
+
 # ──────────────── Main ──────────────────
-def extract_from_text(text, source_id):
+def find_candidates(text, source_id):
     """
-    Return a list of dicts for each expert‐sentence pair in `text`.
+    Return a dict per expert‐sentence pair in `text`, without the emotion yet.
     source_id can be the URL, filename, or DataFrame index.
     """
     results = []
     for sentence in SENT_SPLIT.split(text):
+        if not has_honorific(sentence):
+            continue
         experts = EXPERT_PATTERN.findall(sentence)
         if not experts:
             continue
-        # classify emotion once per sentence
-        emo = emo_pipe(sentence)[0]
         pers = round(compute_persuasion(sentence), 3)
         for expert in experts:
             results.append({
                 "source": source_id,
                 "expert": expert,
                 "quote": sentence.strip(),
-                "emotion_label": emo["label"],
-                "emotion_score": emo["score"],
                 "persuasion_score": pers
             })
     return results
 
 
-def main():
-    # 1. Load the All-The-News dataset
-    print(f"Loading articles from {INPUT_CSV}…")
-    df = pd.read_csv(INPUT_CSV, usecols=["content"], dtype=str)
+def add_emotions(rows, batch_size=BATCH_SIZE):
+    # cached sentences skip the model; the rest are classified once, in length-sorted batches
+    emotions = classify_emotions([r["quote"] for r in rows], get_pipe(), batch_size)
+    for row, emo in zip(rows, emotions):
+        row["emotion_label"] = emo["label"]
+        row["emotion_score"] = emo["score"]
+    return rows
+
 
-    all_entries = []
-    for idx, row in df.iterrows():
-        content = row["content"] or ""
+def extract_from_text(text, source_id):
+    """
+    Return a list of dicts for each expert‐sentence pair in `text`.
+    source_id can be the URL, filename, or DataFrame index.
+    """
+    return add_emotions(find_candidates(text, source_id))
+
+
+# ──────────────── Sharded execution ─────────────────
+def iter_chunks(path=INPUT_CSV, chunk_rows=CHUNK_ROWS):
+    # (first row index, contents) per CHUNK_ROWS articles; the row index is the source id
+    for chunk in pd.read_csv(path, usecols=["content"], dtype=str, chunksize=chunk_rows):
+        yield int(chunk.index[0]), chunk["content"].tolist()
+
+
+def scan_chunk(chunk):
+    # Pool worker: candidate rows of one chunk, without emotions
+    start, contents = chunk
+    rows = []
+    for offset, keep in enumerate(honorific_mask(contents)):
         # you could also pass row["url"] or row["id"] as source,
         # but All-The-News might not include URLs
-        entries = extract_from_text(content, source_id=idx)
-        all_entries.extend(entries)
-        if idx % 1000 == 0 and idx > 0:
-            print(f"  Processed {idx} articles, found {len(all_entries)} expert quotes so far…")
+        if keep:
+            rows.extend(find_candidates(contents[offset], source_id=start + offset))
+    return start, len(contents), rows
+
+
+def _init_inference(workers):
+    # Each model process gets its share of the cores; with torch's default of
+    # all cores per process, N workers would oversubscribe the CPU N times over.
+    # The OpenMP/MKL limits only take effect if set before torch is imported.
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    import torch
+    torch.set_num_threads(threads)
+    get_pipe()
+
+
+CACHE_STATS = ("hits", "misses", "inserted")
+
+
+def classify_chunk(start, n_articles, rows, batch_size=BATCH_SIZE):
+    # Inference worker: emotions for one chunk's rows, plus this call's cache statistics
+    cache = get_cache()
+    before = {k: getattr(cache, k) for k in CACHE_STATS}
+    add_emotions(rows, batch_size)
+    return start, n_articles, rows, {k: getattr(cache, k) - before[k] for k in CACHE_STATS}
+
+
+def run_chunks(chunks, workers=WORKERS, infer_workers=INFER_WORKERS, batch_size=BATCH_SIZE):
+    """
+    Yield (first row, articles, rows with emotions) per chunk of `chunks`, in
+    order. With workers=1 everything runs in this process; otherwise the
+    inference workers' cache statistics are added to this process's cache, so
+    its report() covers the whole run.
+    """
+    chunks = iter(chunks)
+    cache = get_cache()
+    if workers <= 1:
+        for chunk in chunks:
+            start, n, rows = scan_chunk(chunk)
+            yield start, n, add_emotions(rows, batch_size)
+        return
+
+    with ProcessPoolExecutor(workers) as scan, \
+            ProcessPoolExecutor(infer_workers, initializer=_init_inference, initargs=(infer_workers,)) as infer:
+        scanning, classifying = deque(), deque()
+
+        def submit_scan():
+            chunk = next(chunks, None)
+            if chunk is not None:
+                scanning.append(scan.submit(scan_chunk, chunk))
+
+        # a couple of chunks queued per worker keeps every process busy
+        for _ in range(2 * workers):
+            submit_scan()
+        while scanning or classifying:
+            if scanning and len(classifying) < 2 * infer_workers:
+                classifying.append(infer.submit(classify_chunk, *scanning.popleft().result(), batch_size))
+                submit_scan()
+                continue
+            start, n, rows, stats = classifying.popleft().result()
+            for k, v in stats.items():
+                setattr(cache, k, getattr(cache, k) + v)
+            yield start, n, rows
+
+
+# ──────────────── Checkpointed output ─────────────────
+FIELDNAMES = ["source", "expert", "quote", "emotion_label", "emotion_score", "persuasion_score"]
+PART_SCHEMA = pa.schema([
+    ("source", pa.int64()),
+    ("expert", pa.dictionary(pa.int32(), pa.string())),
+    ("quote", pa.string()),
+    ("emotion_label", pa.dictionary(pa.int32(), pa.string())),
+    ("emotion_score", pa.float64()),
+    ("persuasion_score", pa.float64()),
+])
+
+
+def input_fingerprint(path=INPUT_CSV):
+    st = os.stat(path)
+    return {"input": str(Path(path).resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def load_manifest(out_dir, chunk_rows, fresh=False):
+    """
+    Open (or start) the checkpoint in `out_dir`. Returns the chunk size to use,
+    which is the one recorded if the run is resumed, and {start: entry} of the
+    chunks already written. A checkpoint of a different (or changed) input CSV
+    is refused rather than resumed.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / MANIFEST
+    if fresh:
+        path.unlink(missing_ok=True)
+        for old in out_dir.glob("part-*.parquet"):
+            old.unlink()
+    source = input_fingerprint()
+    if not path.exists():
+        path.write_text(json.dumps({**source, "chunk_rows": chunk_rows}) + "\n")
+        return chunk_rows, {}
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    header = json.loads(lines[0])
+    recorded = {k: header.get(k) for k in source}
+    if recorded != source:
+        raise SystemExit(f"Checkpoint in {out_dir} was made from {recorded}, not {source}; "
+                         f"rerun with --fresh to start over")
+    if header["chunk_rows"] != chunk_rows:
+        print(f"Resuming with the checkpoint's chunk size of {header['chunk_rows']} articles")
+    done, torn = {}, False
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            torn = True                     # half-written line from a crash: redo that chunk
+            continue
+        if entry["rows"] == 0 or (out_dir / entry["part"]).exists():
+            done[entry["start"]] = entry
+    if torn:
+        # rewrite without it, so new lines are not appended to the broken one
+        path.write_text("".join(json.dumps(e) + "\n" for e in [header, *done.values()]), encoding="utf-8")
+    return header["chunk_rows"], done
+
+
+def write_part(out_dir, start, n_articles, rows):
+    # Part file first (atomically), then its manifest line: a listed range is always on disk
+    out_dir = Path(out_dir)
+    entry = {"start": start, "end": start + n_articles, "rows": len(rows), "part": None}
+    if rows:
+        entry["part"] = f"part-{start:09d}.parquet"
+        table = pa.Table.from_pylist([{k: r[k] for k in FIELDNAMES} for r in rows], schema=PART_SCHEMA)
+        tmp = out_dir / (entry["part"] + ".tmp")
+        pq.write_table(table, tmp, use_dictionary=["expert", "emotion_label"])
+        os.replace(tmp, out_dir / entry["part"])
+    with open(out_dir / MANIFEST, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return entry
+
+
+def export_csv(out_dir, path):
+    # One part at a time, in article order
+    parts = sorted(Path(out_dir).glob("part-*.parquet"))
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        writer.writerow(FIELDNAMES)
+        for part in parts:
+            df = pd.read_parquet(part, columns=FIELDNAMES)
+            writer.writerows(df.itertuples(index=False, name=None))
+            n += len(df)
+    return n
+
+
+def main(workers=WORKERS, infer_workers=INFER_WORKERS, chunk_rows=CHUNK_ROWS, out_dir=OUTPUT_DIR, fresh=False):
+    # 1. Scan the All-The-News dataset chunk by chunk, skipping checkpointed ranges
+    chunk_rows, done = load_manifest(out_dir, chunk_rows, fresh)
+    found = sum(e["rows"] for e in done.values())
+    if done:
+        print(f"Resuming: {len(done)} chunks ({found} expert quotes) already in {out_dir}")
+    print(f"Loading articles from {INPUT_CSV} ({workers} workers, {infer_workers} for inference)…")
+    # skipped chunks are still parsed by read_csv, but never scanned or classified
+    todo = (c for c in iter_chunks(INPUT_CSV, chunk_rows) if c[0] not in done)
+    for start, n, rows in run_chunks(todo, workers, infer_workers):
+        write_part(out_dir, start, n, rows)
+        found += len(rows)
+        print(f"  Processed {start + n} articles, found {found} expert quotes so far…")
+    print(get_cache().report())
 
-    if not all_entries:
+    if not found:
         print("No expert quotes found in any article.")
         return
 
-    # 2. Write to CSV
-    fieldnames = ["source", "expert", "quote", "emotion_label", "emotion_score", "persuasion_score"]
-    with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as out:
-        writer = csv.DictWriter(out, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(all_entries)
-    print(f"Done—wrote {len(all_entries)} rows to {OUTPUT_CSV}")
+    # 2. Export the parts to CSV
+    n = export_csv(out_dir, OUTPUT_CSV)
+    print(f"Done—wrote {n} rows to {out_dir}/ and {OUTPUT_CSV}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Expert quotes with emotion and persuasion scores from all-the-news")
+    ap.add_argument("--workers", type=int, default=WORKERS, help="processes scanning articles (1 = no pool)")
+    ap.add_argument("--infer-workers", type=int, default=INFER_WORKERS, help="processes running the model")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="articles per chunk")
+    ap.add_argument("--out-dir", default=OUTPUT_DIR, help="Parquet parts and checkpoint manifest")
+    ap.add_argument("--fresh", action="store_true", help="discard the checkpoint and start over")
+    args = ap.parse_args()
+    main(args.workers, args.infer_workers, args.chunk_rows, args.out_dir, args.fresh)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Candidate extraction throughput on all-the-news, with and without the
+# honorific prefilter, in one process and across a scanning pool. Only the scan
+# stage is timed (no model); both paths must find exactly the same candidates.
+#
+#   python bench_prefilter.py                        # first 50,000 articles
+#   python bench_prefilter.py --rows 500000 --workers 1 4 8
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PracticeLargerExpertWebscraping import (
+    CHUNK_ROWS, EXPERT_PATTERN, INPUT_CSV, SENT_SPLIT, compute_persuasion, honorific_mask, iter_chunks, scan_chunk,
+)
+
+ROWS = 50_000
+
+
+def scan_chunk_full(chunk):
+    # Reference: every article split into sentences, EXPERT_PATTERN on each one
+    start, contents = chunk
+    rows = []
+    for offset, content in enumerate(contents):
+        text = content if isinstance(content, str) else ""
+        for sentence in SENT_SPLIT.split(text):
+            experts = EXPERT_PATTERN.findall(sentence)
+            if not experts:
+                continue
+            pers = round(compute_persuasion(sentence), 3)
+            for expert in experts:
+                rows.append({"source": start + offset, "expert": expert, "quote": sentence.strip(),
+                             "persuasion_score": pers})
+    return start, len(contents), rows
+
+
+def load(rows, chunk_rows):
+    chunks, n = [], 0
+    for start, contents in iter_chunks(INPUT_CSV, chunk_rows):
+        contents = contents[:rows - n]
+        chunks.append((start, contents))
+        n += len(contents)
+        if n >= rows:
+            break
+    return chunks, n
+
+
+def timed(label, fn, chunks, workers, articles):
+    t0 = time.perf_counter()
+    if workers <= 1:
+        out = [fn(c) for c in chunks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            out = list(pool.map(fn, chunks))
+    dt = time.perf_counter() - t0
+    found = [r for _, _, rows in out for r in rows]
+    r = {"stage": label, "workers": workers, "seconds": dt, "articles_per_sec": articles / dt,
+         "candidates": len(found), "candidates_per_sec": len(found) / dt}
+    print(f"{label:<12} {workers:>3} workers {dt:8.2f}s  {r['articles_per_sec']:12,.0f} articles/s  "
+          f"{r['candidates_per_sec']:10,.0f} candidates/s")
+    return r, found
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Honorific prefilter benchmark on all-the-news")
+    ap.add_argument("--rows", type=int, default=ROWS, help="articles to read from the start of the CSV")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--workers", type=int, nargs="*", default=[1], help="pool sizes to time the scan with")
+    ap.add_argument("--out", default="bench_prefilter.json")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    chunks, articles = load(args.rows, args.chunk_rows)
+    print(f"Read {articles} articles from {INPUT_CSV} in {time.perf_counter() - t0:.1f}s")
+    kept = sum(sum(honorific_mask(contents)) for _, contents in chunks)
+    print(f"Prefilter keeps {kept} articles ({kept / max(articles, 1):.1%})")
+
+    results = []
+    for workers in args.workers:
+        full, expected = timed("full regex", scan_chunk_full, chunks, workers, articles)
+        pre, found = timed("prefilter", scan_chunk, chunks, workers, articles)
+        if found != expected:
+            raise SystemExit("prefilter changed the candidates")
+        print(f"  speedup x{full['seconds'] / pre['seconds']:.2f}")
+        results += [full, pre]
+
+    report = {"when": time.strftime("%Y-%m-%d %H:%M:%S"), "input": str(INPUT_CSV), "articles": articles,
+              "kept": kept, "results": results}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Wrote:", args.out)
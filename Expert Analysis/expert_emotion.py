@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# Batched, cached emotion classification shared by the expert extraction scripts.
+#
+# Instead of one forward pass per sentence, candidate texts are collected first
+# (across many articles), de-duplicated, sorted by length so each batch pads to
+# roughly the same size, and sent through the pipeline BATCH_SIZE at a time.
+# Results come back in the order of the input texts.
+#
+# Every result is also kept in a persistent SQLite cache next to this file,
+# keyed by sha256(model id, normalized text), so reruns and wire-service
+# sentences repeated across articles never reach the model twice. The cache is
+# shared by all three scripts and evicts least-recently-used rows beyond
+# CACHE_MAX_ENTRIES. Lookups only read: the last_used touches they cause are
+# written together with the next insert batch (or on close), and the row count
+# is tracked in memory, so a batch costs at most one commit.
+import atexit
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from pathlib import Path
+
+# ──────────────── Config ─────────────────
+BATCH_SIZE = 32
+# Texts longer than the model's 512 tokens are truncated rather than erroring
+PIPE_KWARGS = {"truncation": True}
+CACHE_PATH = Path(os.getenv("EMOTION_CACHE", Path(__file__).resolve().parent / "emotion_cache.sqlite"))
+CACHE_MAX_ENTRIES = 2_000_000
+SQL_CHUNK = 500  # keys per IN (...) query, below SQLite's variable limit
+TOUCH_FLUSH = 50_000  # pending last_used touches written even without an insert
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def model_id(pipe):
+    model = getattr(pipe, "model", None)
+    return getattr(model, "name_or_path", None) or getattr(getattr(model, "config", None), "_name_or_path", "unknown")
+
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+
+# ──────────────── Cache ─────────────────
+class EmotionCache:
+    """Persistent key -> {"label", "score"} store with LRU eviction and hit stats."""
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = self.misses = self.inserted = 0
+        self.touched = set()  # keys looked up since the last write
+        self.db = sqlite3.connect(self.path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS emotions ("
+            "key TEXT PRIMARY KEY, label TEXT NOT NULL, score REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS emotions_last_used ON emotions(last_used)")
+        self.db.commit()
+        (self.count,) = self.db.execute("SELECT COUNT(*) FROM emotions").fetchone()
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), SQL_CHUNK):
+            chunk = keys[start:start + SQL_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows = self.db.execute(f"SELECT key, label, score FROM emotions WHERE key IN ({marks})", chunk)
+            for key, label, score in rows:
+                found[key] = {"label": label, "score": score}
+        self.touched.update(found)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        if len(self.touched) >= TOUCH_FLUSH:
+            self._touch()
+            self.db.commit()
+        return found
+
+    def _touch(self):
+        # Write the pending last_used updates (inside the caller's transaction)
+        keys, now = list(self.touched), time.time()
+        for start in range(0, len(keys), SQL_CHUNK):
+            chunk = keys[start:start + SQL_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            self.db.execute(f"UPDATE emotions SET last_used = ? WHERE key IN ({marks})", [now, *chunk])
+        self.touched.clear()
+
+    def put_many(self, items):
+        now = time.time()
+        self._touch()
+        # a key is a hash of model and text, so a row that is already there holds the same result
+        cur = self.db.executemany(
+            "INSERT OR IGNORE INTO emotions (key, label, score, last_used) VALUES (?, ?, ?, ?)",
+            [(key, emo["label"], float(emo["score"]), now) for key, emo in items.items()],
+        )
+        self.count += cur.rowcount
+        self.inserted += cur.rowcount
+        if self.count > self.max_entries:
+            self.evict()
+        self.db.commit()
+
+    def evict(self):
+        # Drop the least recently used rows down to 90% of the limit. Other
+        # processes may share the file, so the real count is re-read here.
+        (self.count,) = self.db.execute("SELECT COUNT(*) FROM emotions").fetchone()
+        excess = self.count - int(self.max_entries * 0.9)
+        if excess > 0:
+            cur = self.db.execute(
+                "DELETE FROM emotions WHERE key IN (SELECT key FROM emotions ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self.count -= cur.rowcount
+
+    def close(self):
+        self._touch()
+        self.db.commit()
+        self.db.close()
+
+    def report(self):
+        # the entry count is re-read: other processes (pool workers) may have written since
+        looked_up = self.hits + self.misses
+        rate = self.hits / looked_up if looked_up else 0.0
+        (self.count,) = self.db.execute("SELECT COUNT(*) FROM emotions").fetchone()
+        return (f"Emotion cache {self.path.name}: {self.hits}/{looked_up} hits ({rate:.1%}), "
+                f"{self.misses} classified, {self.inserted} added, {self.count} entries")
+
+
+_cache = None
+
+
+def get_cache():
+    # One cache connection per process, opened on first use
+    global _cache
+    if _cache is None:
+        _cache = EmotionCache()
+        atexit.register(_cache.close)
+    return _cache
+
+
+# ──────────────── Classification ─────────────────
+def _top(result):
+    # A single text gives {"label", "score"}; with all scores it is a list
+    return max(result, key=lambda r: r["score"]) if isinstance(result, list) else result
+
+
+def classify_emotions(texts, pipe, batch_size=BATCH_SIZE, cache=True):
+    """
+    Return the top {"label", "score"} for every text in `texts`, in order.
+    Each distinct (normalized) text is looked up in the cache first; the rest
+    are classified once each, in batches of texts with similar length.
+    """
+    model = model_id(pipe)
+    keys = [cache_key(model, t) for t in texts]
+    first = dict(zip(keys, texts))          # one representative text per key
+    store = get_cache() if cache is True else cache or None
+    results = store.get_many(first) if store else {}
+
+    # character length is a close enough proxy for token length to bucket by
+    todo = sorted((k for k in first if k not in results), key=lambda k: len(first[k]))
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        out = pipe([first[k] for k in batch], batch_size=len(batch), **PIPE_KWARGS)
+        fresh = {k: _top(res) for k, res in zip(batch, out)}
+        results.update(fresh)
+        if store:
+            store.put_many(fresh)
+    return [results[k] for k in keys]